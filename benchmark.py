@@ -0,0 +1,261 @@
+import gc
+import os
+import random
+import resource
+import sys
+import time
+from maze_lib import maze_lib as maze_lib
+
+def timed(fn):
+    start = time.time()
+    fn()
+    return time.time() - start
+
+def peak_mb():
+    '''The process's peak resident memory so far, in MB.'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+STORAGES = [('object', None), ('packed', maze_lib.PackedGrid), ('edges', maze_lib.EdgeGrid)]
+
+def fresh_maze(style, height, width, storage=maze_lib.PackedGrid, seed=None, rng=None):
+    '''A new maze to time, with random seeded first when seed is given.'''
+    if seed is not None:
+        random.seed(seed)
+    return maze_lib.new_maze(style, height, width, 'B', storage, rng)
+
+def per_storage(measure, fmt, prefix='', skip=()):
+    '''
+    One line per storage in STORAGES (but those named in skip): prefix, the
+    storage's name, then fmt filled in from the tuple measure(storage) returns.
+    '''
+    for (name, storage) in STORAGES:
+        if name in skip:
+            continue
+        gc.collect()
+        print(('  %s%-8s ' + fmt) % ((prefix, name) + tuple(measure(storage))))
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    '''Register the decorated function as the benchmark run by "python benchmark.py name".'''
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+@benchmark('storage')
+def bench_storage(height=300, width=300):
+    '''
+    Bytes per cell of a zigzag maze and of a generated, searched kruskal maze, and
+    add_door calls per second laying the zigzag a door at a time.
+    '''
+    cells = height * width
+    print('storage backends, %dx%d' % (height, width))
+    def measure(storage):
+        maze = maze_lib.Maze(height, width, 'B', storage)
+        seconds = timed(maze.zigzag_one_by_one)
+        zigzag = float(maze_lib.deep_sizeof(maze.grid)) / cells
+        maze = fresh_maze('kruskal', height, width, storage, seed=1)
+        maze.start_generation()
+        maze.open_outer_walls()
+        maze.color_from(1, maze_lib.Coord(0, 0)) # searches hand out Coords; the grid must not keep them
+        return (zigzag, float(maze_lib.deep_sizeof(maze.grid)) / cells, (cells - 1) / seconds)
+    per_storage(measure, 'zigzag %7.1f, kruskal %7.1f bytes/cell %10.0f add_door/s')
+
+@benchmark('move_door')
+def bench_move_door(height=75, width=100, moves=32):
+    '''move_door repaints the whole maze twice per move; the palette makes that O(1).'''
+    print('move_door x%d, %dx%d' % (moves, height, width))
+    def measure(storage):
+        maze = fresh_maze('zigzag', height, width, storage)
+        maze.start_generation()
+        return (timed(lambda: [maze.move_door() for i in range(moves)]),)
+    per_storage(measure, '%8.2f s')
+
+@benchmark('startup')
+def bench_startup(height=1000, width=1000):
+    '''Time to construct an empty Maze and the Python objects it keeps resident.'''
+    print('Maze construction, %dx%d' % (height, width))
+    def measure(storage):
+        before = len(gc.get_objects())
+        holder = []
+        seconds = timed(lambda: holder.append(maze_lib.Maze(height, width, 'B', storage)))
+        return (seconds, len(gc.get_objects()) - before)
+    per_storage(measure, '%8.2f s %10d objects')
+
+@benchmark('analysis')
+def bench_analysis(height=75, width=100, clicks=10):
+    '''Repeated Solution and Distance clicks on an unchanged maze, as in maze_3.'''
+    print('Solution + Distance x%d, %dx%d' % (clicks, height, width))
+    def measure(storage):
+        maze = fresh_maze('kruskal', height, width, storage)
+        maze.start_generation()
+        maze.open_outer_walls()
+        def click():
+            maze.color_all(0)
+            maze.cells_from_to(maze.get_first_cell(), maze.get_last_cell(), 1)
+            maze.distance_from(maze.get_first_cell())
+        first = timed(click)
+        return (first, timed(lambda: [click() for i in range(clicks - 1)]) / (clicks - 1))
+    per_storage(measure, 'first %6.3f s, then %6.3f s each')
+
+@benchmark('kruskal_sets')
+def bench_kruskal_sets(sizes=(100, 300, 1000, 3000)):
+    '''Kruskal's set work (can_kruskal_join then kruskal_join_sets on every wall) as the maze grows.'''
+    print('Kruskal set joins')
+    for n in sizes:
+        random.seed(n)
+        edges = maze_lib.nextdoor_edge_ids(n, n) # the walls kruskal_join_all shuffles
+        random.shuffle(edges)
+        sets = maze_lib.DisjointSet(n * n)
+        def join_all():
+            for e in edges:
+                i = e >> 1
+                j = i + 1 if e & 1 else i - n
+                if not sets.same(i, j):
+                    sets.union(i, j)
+        seconds = timed(join_all)
+        print('  %4dx%-4d %8.2f s %6.2f us/wall %d set' % (n, n, seconds, seconds * 1e6 / len(edges), sets.count))
+
+@benchmark('kruskal')
+def bench_kruskal(sizes=(100, 300, 1000)):
+    '''Whole KruskalMaze generations on a PackedGrid, with the peak memory of the process so far.'''
+    print('KruskalMaze on a PackedGrid')
+    for n in sizes:
+        seconds = timed(fresh_maze('kruskal', n, n, seed=n).start_generation)
+        print('  %4dx%-4d %8.2f s peak %5d MB' % (n, n, seconds, peak_mb()))
+
+@benchmark('parallel_kruskal')
+def bench_parallel_kruskal(sizes=(300, 1000), processes=(1, 2, 4)):
+    '''Serial kruskal against parallel_kruskal in PARALLEL_KRUSKAL_STRIPS strips, on a PackedGrid.'''
+    print('Kruskal serial / in %d strips' % maze_lib.PARALLEL_KRUSKAL_STRIPS)
+    for n in sizes:
+        print('  %4dx%-4d serial      %8.2f s' % (n, n, timed(fresh_maze('kruskal', n, n, seed=n).start_generation)))
+        for p in processes:
+            maze = fresh_maze('kruskal', n, n)
+            seconds = timed(lambda: maze.parallel_kruskal(processes=p, seed=n))
+            print('  %4dx%-4d %d processes %8.2f s' % (n, n, p, seconds))
+
+@benchmark('array_kruskal')
+def bench_array_kruskal(sizes=(300, 1000, 2000)):
+    '''Serial kruskal on a PackedGrid against array_kruskal on each storage; Cell objects stop at 1000x1000.'''
+    print('Kruskal serial / on arrays')
+    for n in sizes:
+        print('  %4dx%-4d serial packed %8.2f s' % (n, n, timed(fresh_maze('kruskal', n, n, seed=n).start_generation)))
+        per_storage(lambda storage: (timed(fresh_maze('kruskal', n, n, storage, seed=n).array_kruskal),),
+                    '%8.2f s', '%4dx%-4d arrays ' % (n, n), ('object',) if n > 1000 else ())
+
+@benchmark('layouts')
+def bench_layouts(height=300, width=300):
+    '''The fixed zigzag, zagzig and spiral layouts, a door at a time against one add_doors call.'''
+    print('Fixed layouts, %dx%d' % (height, width))
+    for style in ['zigzag', 'zagzig', 'mono_spiral', 'bi_spiral']:
+        def measure(storage):
+            one_by_one = timed(getattr(maze_lib.Maze(height, width, 'B', storage), style + '_one_by_one'))
+            return (one_by_one, timed(getattr(maze_lib.Maze(height, width, 'B', storage), style + '_connect_all')))
+        per_storage(measure, '%7.3f s one by one %7.3f s at once', '%-12s ' % style)
+
+@benchmark('implicit')
+def bench_implicit(sizes=(100, 300, 1000)):
+    '''One corner-to-corner path through a zigzag maze: built on a PackedGrid and searched, against an ImplicitMaze.'''
+    print('Zigzag path, built and searched / implicit')
+    for n in sizes:
+        (start, end) = (maze_lib.Coord(0, 0), maze_lib.Coord(n - 1, n - 1))
+        def built():
+            maze = maze_lib.Maze(n, n, 'B', maze_lib.PackedGrid)
+            maze.connect_all(maze_lib.ZIGZAG)
+            maze.path_from_to(start, end, 7)
+        implicit = timed(lambda: maze_lib.implicit_maze(maze_lib.ZIGZAG, n, n).path_from_to(start, end))
+        print('  %4dx%-4d %8.3f s %8.3f s' % (n, n, timed(built), implicit))
+
+@benchmark('templates')
+def bench_templates(sizes=(100, 300, 1000)):
+    '''stamp_templates filling a fresh PackedGrid maze, against the 90 templates random_template lays.'''
+    print('Templates stamped in one call')
+    for n in sizes:
+        legacy = timed(fresh_maze('random_template', n, n, seed=n).start_generation)
+        maze = fresh_maze('stamped_template', n, n)
+        maze.set_up_unlinked_kruskal()
+        maze.color_all(1)
+        holder = []
+        seconds = timed(lambda: holder.append(maze.stamp_templates()))
+        print('  %4dx%-4d 90 one at a time %6.2f s, %7d at once %6.2f s' % (n, n, legacy, len(holder[0]), seconds))
+
+@benchmark('kruskal_walks')
+def bench_kruskal_walks(height=300, width=300, repeats=5):
+    '''The walk phase of kruskal_walk2 and random_template, which pick a direction after every step.'''
+    print('Kruskal walk phases, %dx%d' % (height, width))
+    for style in ['kruskal_walk2', 'random_template']:
+        def measure(storage):
+            random.seed(repeats)
+            mazes = [fresh_maze(style, height, width, storage) for i in range(repeats)]
+            return (timed(lambda: [maze.start_generation() for maze in mazes]) / repeats,)
+        per_storage(measure, '%8.3f s', '%-16s ' % style)
+
+@benchmark('walk_run')
+def bench_walk_run(height=75, width=100):
+    '''walk and run generations, which draw a fresh start from the bicolor frontier whenever they get stuck.'''
+    print('Walk and run mazes, %dx%d' % (height, width))
+    for style in ['walk', 'run']:
+        per_storage(lambda storage: (timed(fresh_maze(style, height, width, storage, seed=3).start_generation),),
+                    '%8.3f s', '%-4s ' % style)
+
+@benchmark('picks')
+def bench_picks(height=300, width=300, picks=300000):
+    '''Walk direction picks per second from the walk masks, then whole walk mazes.'''
+    print('Walk direction picks, %dx%d' % (height, width))
+    size = height * width
+    def measure(storage):
+        maze = fresh_maze('walk', height, width, storage, seed=1)
+        maze.color_all(1)
+        masks = maze.walk_masks()
+        for i in range(0, size, 3):
+            maze.grid.cell_at(i).set_color(5)
+        ids = [random.randrange(size) for k in range(picks)]
+        seconds = timed(lambda: [masks.pick(i) for i in ids])
+        maze = fresh_maze('walk', height, width, storage)
+        return (picks / seconds, (size - 1) / timed(maze.start_generation))
+    per_storage(measure, '%9.0f picks/s, walk maze %7.0f steps/s')
+
+@benchmark('weaves')
+def bench_weaves(height=300, width=300, densities=(0.02, 0.05, 0.1)):
+    '''Weaves asked for and made: random tries against place_weaves, on a PackedGrid.'''
+    print('Weave crosses, %dx%d' % (height, width))
+    for density in densities:
+        wanted = int(density * height * width)
+        for spread in [False, True]:
+            maze = fresh_maze('weaved', height, width, seed=1)
+            holder = []
+            seconds = timed(lambda: holder.append(maze.kruskal_weave(wanted, None, spread)))
+            print('  %-6s %6d asked %6d made %7.2f s' % ('spread' if spread else 'random', wanted, holder[0], seconds))
+
+@benchmark('rng')
+def bench_rng(sizes=(300, 1000)):
+    '''Kruskal mazes drawing from the shared stream, a MazeRandom of their own, and one in bulk mode.'''
+    print('Maze random generators')
+    for n in sizes:
+        for (name, rng) in [('shared', None), ('own', maze_lib.MazeRandom(n)), ('bulk', maze_lib.MazeRandom(n, True))]:
+            maze = fresh_maze('kruskal', n, n, seed=n, rng=rng)
+            maze.color_all(1)
+            edges = maze.nextdoor_edge_ids()
+            shuffle = timed(lambda: maze.rng.shuffle_ids(edges))
+            seconds = timed(fresh_maze('kruskal', n, n, rng=rng).start_generation)
+            print('  %5dx%-5d %-6s shuffle %6.2f s, kruskal maze %7.2f s' % (n, n, name, shuffle, seconds))
+
+@benchmark('eller')
+def bench_eller(width=100, heights=(10000, 100000)):
+    '''Eller mazes streamed row by row to os.devnull as text, then one built in a PackedGrid.'''
+    print('Eller rows, width %d' % width)
+    for height in heights:
+        out = open(os.devnull, 'w')
+        rows = maze_lib.eller_rows(height, width, maze_lib.MazeRandom(height))
+        seconds = timed(lambda: maze_lib.write_rows_text(rows, out, width))
+        out.close()
+        print('  streamed %8d rows %7.2f s %8.0f rows/s, peak %5d MB' % (height, seconds, height / seconds, peak_mb()))
+    height = heights[0]
+    seconds = timed(fresh_maze('eller', height, width, rng=maze_lib.MazeRandom(height)).start_generation)
+    print('  grid     %8d rows %7.2f s %8.0f rows/s' % (height, seconds, height / seconds))
+
+if __name__ == '__main__':
+    for name in (sys.argv[1:] or sorted(BENCHMARKS)):
+        BENCHMARKS[name]()
@@ -101,11 +101,12 @@ class MazeApp(object):
          print('random generator being seeded with %s' % (seed))
          self.seed = seed
          random.seed(seed)
+      self.rng = maze_lib.MazeRandom(seed) # the maze's own stream: the printed seed replays it
 
    def prepare_maze(self):
       self.effective_x = self.X
       self.effective_y = self.Y
-      self.maze = maze_lib.new_maze(self.outer_style.get(), self.X, self.Y, 'mono')
+      self.maze = maze_lib.new_maze(self.outer_style.get(), self.X, self.Y, 'mono', rng=self.rng)
       self.maze.start_generation(self.progress)
       for i in range(self.get_outer_count()):
          self.maze.move_door()
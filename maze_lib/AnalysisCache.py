@@ -0,0 +1,78 @@
+import unittest
+import collections
+from array import array
+from MemoryUse import deep_sizeof
+
+ANALYSIS_CACHE_BYTES = 32 * 1024 * 1024 # a few whole-maze searches of a 1000x1000 maze
+
+class AnalysisCache(object):
+    '''
+    The most recently used results of maze analyses, keyed by (analysis, arguments, version).
+    The maze bumps its version on every door change, so stale entries are never looked up
+    again and simply age out. At most size entries are kept, holding at most max_bytes
+    between them; an entry bigger than that on its own is not kept at all.
+    '''
+    def __init__(self, size=8, max_bytes=ANALYSIS_CACHE_BYTES):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict() # key -> (entry, its bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+    def get(self, key):
+        '''The entry stored under key, or None.'''
+        stored = self.entries.pop(key, None)
+        if stored is None:
+            self.misses += 1
+            return None
+        self.entries[key] = stored # now the most recently used
+        self.hits += 1
+        return stored[0]
+    def put(self, key, entry):
+        self.discard(key)
+        entry_bytes = deep_sizeof(entry)
+        if entry_bytes > self.max_bytes:
+            return
+        self.entries[key] = (entry, entry_bytes)
+        self.bytes += entry_bytes
+        while len(self.entries) > self.size or self.bytes > self.max_bytes:
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+    def discard(self, key):
+        stored = self.entries.pop(key, None)
+        if stored is not None:
+            self.bytes -= stored[1]
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+    def __len__(self):
+        return len(self.entries)
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = AnalysisCache()
+        self.assertEqual(cache.get(('a', (), 0)), None)
+        cache.put(('a', (), 0), 5)
+        self.assertEqual(cache.get(('a', (), 0)), 5)
+        self.assertEqual(cache.get(('a', (), 1)), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+    def test_least_recently_used_goes_first(self):
+        cache = AnalysisCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+    def test_bounded_by_bytes(self):
+        block = deep_sizeof(array('i', [0]) * 1000)
+        cache = AnalysisCache(8, 2 * block + 100)
+        for key in 'abc':
+            cache.put(key, array('i', [0]) * 1000)
+        self.assertEqual(list(cache.entries), ['b', 'c'])
+        self.assertEqual(cache.bytes, 2 * block)
+        cache.put('d', array('i', [0]) * 3000) # too big to keep at all
+        self.assertEqual((cache.get('d'), len(cache)), (None, 2))
+        cache.put('c', 5)
+        self.assertEqual(cache.bytes, block + deep_sizeof(5))
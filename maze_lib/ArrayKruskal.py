@@ -0,0 +1,106 @@
+import unittest
+import random
+try:
+   import numpy
+except ImportError:
+   numpy = None # array_kruskal_walls needs it
+from DisjointSet import *
+
+# Walls are numbered as in Maze.nextdoor_edge_ids: cell*2 is the wall north of cell,
+# cell*2+1 the wall east of it.
+#
+# Kruskal opens the walls of a shuffled list in order whenever they join two sets,
+# which builds the minimum spanning tree with each wall weighted by its place in the
+# list. That tree is unique, so Boruvka's algorithm builds it too, and Boruvka needs
+# no per-wall loop: in each round every set takes its lightest wall out, all at once
+# with array operations, and the sets it joins are merged by pointer jumping. Every
+# round at least halves the number of sets.
+
+def interior_walls(height, width):
+    '''Every wall between two cells, as wall ids in a numpy array.'''
+    cells = numpy.arange(height * width, dtype=numpy.int32)
+    north = cells[width:] * 2
+    east = cells[(cells % width) != width - 1] * 2 + 1
+    return numpy.concatenate((north, east))
+
+def array_kruskal_walls(height, width, rng):
+    '''
+    The walls a Kruskal maze of height x width opens, as a numpy array of wall ids,
+    with the wall order shuffled by rng, a numpy RandomState.
+    '''
+    walls = interior_walls(height, width)
+    walls = walls[rng.permutation(len(walls))] # a wall's place is now its weight
+    cells = walls >> 1
+    others = numpy.where(walls & 1, cells + 1, cells - width)
+    size = height * width
+    sets = numpy.arange(size, dtype=numpy.int32) # each cell's set, named by one of its cells
+    live = numpy.arange(len(walls), dtype=numpy.int32) # walls that may still join two sets
+    opened = numpy.zeros(len(walls), dtype=bool)
+    while True:
+        (a, b) = (sets[cells[live]], sets[others[live]])
+        keep = a != b
+        (live, a, b) = (live[keep], a[keep], b[keep])
+        if len(live) == 0:
+            break
+        lightest = lightest_walls(size, a, b, live, len(walls))
+        joining = numpy.nonzero(lightest < len(walls))[0].astype(numpy.int32)
+        taken = lightest[joining]
+        opened[taken] = True
+        (ta, tb) = (sets[cells[taken]], sets[others[taken]])
+        partner = numpy.arange(size, dtype=numpy.int32)
+        others_of = numpy.where(ta == joining, tb, ta)
+        partner[joining] = others_of
+        # two sets that took the same wall point at each other; the lower one leads
+        mutual = (partner[others_of] == joining) & (joining < others_of)
+        partner[joining[mutual]] = joining[mutual]
+        # pointer jumping, over the joining sets only as the rest point at themselves
+        while True:
+            jumped = partner[partner[joining]]
+            if numpy.array_equal(jumped, partner[joining]):
+                break
+            partner[joining] = jumped
+        sets = partner[sets]
+    return walls[opened]
+
+def lightest_walls(size, a, b, live, none):
+    '''
+    For each set, the lightest of the live walls, which join sets a and b; none for
+    a set with no wall out. live is in increasing order, so writing it backwards
+    leaves each set its lightest wall when numpy writes repeated indices in order,
+    as it does; numpy does not promise that, so the answer is checked and worked
+    out the slow way with minimum.at if it is wrong.
+    '''
+    lightest = numpy.full(size, none, dtype=numpy.int32)
+    ends = numpy.column_stack((a, b)).ravel()[::-1]
+    lightest[ends] = numpy.repeat(live, 2)[::-1]
+    if not ((lightest[a] <= live).all() and (lightest[b] <= live).all()):
+        lightest.fill(none)
+        numpy.minimum.at(lightest, a, live)
+        numpy.minimum.at(lightest, b, live)
+    return lightest
+
+def kruskal_walls_one_by_one(height, width, walls):
+    '''Kruskal over walls in the order given, with a DisjointSet; for checking array_kruskal_walls.'''
+    sets = DisjointSet(height * width)
+    opened = []
+    for wall in walls:
+        cell = wall >> 1
+        if sets.union(cell, cell + 1 if wall & 1 else cell - width):
+            opened.append(wall)
+    return opened
+
+@unittest.skipIf(numpy is None, 'array_kruskal_walls needs numpy')
+class TestArrayKruskal(unittest.TestCase):
+    def test_interior_walls(self):
+        self.assertEqual(sorted(interior_walls(3, 4)), [1, 3, 5, 8, 9, 10, 11, 12, 13, 14, 16, 17, 18, 19, 20, 21, 22])
+    def test_lightest_walls(self):
+        (a, b) = (numpy.array([0, 2, 0, 3]), numpy.array([1, 1, 2, 2]))
+        self.assertEqual(list(lightest_walls(5, a, b, numpy.array([2, 4, 7, 9]), 10)), [2, 2, 4, 9, 10])
+    def test_same_tree_as_one_by_one(self):
+        for (height, width, seed) in [(1, 9, 1), (7, 5, 2), (20, 31, 3)]:
+            walls = interior_walls(height, width)
+            shuffled = walls[numpy.random.RandomState(seed).permutation(len(walls))]
+            expected = sorted(kruskal_walls_one_by_one(height, width, shuffled))
+            opened = array_kruskal_walls(height, width, numpy.random.RandomState(seed))
+            self.assertEqual(sorted(opened), expected)
+            self.assertEqual(len(opened), height * width - 1)
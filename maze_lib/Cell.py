@@ -1,40 +1,110 @@
 import unittest
+import itertools
 from Coord import *
 import Door as DoorModule
 
-global_next_id = 1
+# Cells in a maze get dense ids from their grid; these are only for cells made on their own.
+global_next_id = itertools.count(1)
 def get_next_id():
-   global global_next_id
-   answer = global_next_id
-   global_next_id += 1
-   return answer
+   return next(global_next_id)
+
+class UnderOverlay(object):
+    '''
+    The under cells of one grid, keyed by the id of the cell woven over them,
+    which for grid cells is the packed coordinate x*width+y.
+    Weaves are rare, so only the woven cells take any room here.
+    '''
+    def __init__(self):
+        self.unders = {}
+    def get(self, over_id):
+        return self.unders.get(over_id)
+    def set(self, over_id, under_cell):
+        if under_cell is None:
+            self.unders.pop(over_id, None)
+        else:
+            self.unders[over_id] = under_cell
+    def __contains__(self, over_id):
+        return over_id in self.unders
+    def __len__(self):
+        return len(self.unders)
+    def under_cells(self):
+        return list(self.unders.values())
+
+class Palette(object):
+    '''
+    Shared by all the cells of one grid so that repainting every cell is O(1):
+    a cell's own color only counts while its stamp matches the current epoch,
+    otherwise the cell shows the background of the last repaint.
+    '''
+    def __init__(self):
+        self.epoch = 0
+        self.background = 0
+        self.painted = 0 # set_color calls since the last repaint
+    def repaint(self, color):
+        self.epoch += 1
+        self.background = color
+        self.painted = 0
+    def token(self):
+        '''Equal tokens mean equal colors: every fresh repaint in a color looks the same.'''
+        if self.painted == 0:
+            return ('fresh', self.background)
+        return (self.epoch, self.painted)
+
+class GridState(object):
+    '''
+    The rest of what the cells of one grid share: the under cell overlay, and
+    the TemplateLocks and WalkMasks the cells keep up to date once the grid
+    has made them. The grid owns it; its cells reach it through their state.
+    '''
+    def __init__(self):
+        self.unders = UnderOverlay()
+        self.template_locks = None # a TemplateLocks, once the grid is asked for one
+        self.walk_masks = None # a WalkMasks, once the grid is asked for one
+
+# a cell's doors live in four slots rather than a list of its own, indexed by direction
+DOOR_SLOTS = ('north_door', 'east_door', 'south_door', 'west_door')
 
 class Cell(object):
-    def __init__(self, coord, zone=''):
+    __slots__ = ('coord', 'zone') + DOOR_SLOTS + ('palette', 'state', 'color', 'stamp', 'prev', 'distance', 'id', 'free_template', 'free_link')
+    def __init__(self, coord, zone='', cell_id=None, palette=None, state=None):
         self.coord = coord
         self.zone = zone
-        self.doors = [None for x in range(4)] # no doors in any of the directions
+        self.north_door = None # no doors in any of the directions
+        self.east_door = None
+        self.south_door = None
+        self.west_door = None
+        self.palette = palette if palette is not None else Palette()
+        self.state = state if state is not None else GridState()
         self.color = 0
+        self.stamp = self.palette.epoch
         self.prev = coord
         self.distance = 0
-        self.id = get_next_id()
-        self.under_cell = None
+        self.id = cell_id if cell_id is not None else get_next_id()
         self.free_template = True
         self.free_link = True
     def get_id(self):
         return self.id
     def set_color(self, color):
         self.color = color
+        self.stamp = self.palette.epoch
+        self.palette.painted += 1
+        if self.state.walk_masks is not None:
+            self.state.walk_masks.color_changed(self.id, color)
     def get_color(self):
-        return self.color
+        if self.stamp == self.palette.epoch:
+            return self.color
+        return self.palette.background
     def is_color(self, color):
-        return self.color == color
+        return self.get_color() == color
     def __str__(self):
         return 'Cell_%d%s' % (self.id, self.coord)
     def __repr__(self):
         return str(self)
+    @property
+    def doors(self):
+        return (self.north_door, self.east_door, self.south_door, self.west_door)
     def has_door(self, direction):
-        return self.doors[direction] is not None
+        return getattr(self, DOOR_SLOTS[direction]) is not None
     def get_doors(self):
         return [d for d in self.doors if d is not None and d.is_real_door()]
     def get_door_count(self):
@@ -43,12 +113,19 @@ class Cell(object):
             if d is not None:
                 c += 1
         return c
+    def get_mask(self):
+        '''Bit d set means a door in direction d, as in PackedGrid.'''
+        m = 0
+        for d in range(4):
+            if getattr(self, DOOR_SLOTS[d]) is not None:
+                m |= 1 << d
+        return m
     def is_unlinked(self):
         return self.get_door_count() == 0
     def add_door(self, direction, door):
         if door is not None:
             _ = door.get_direction() # will throw an exception of door isn't a Door
-        self.doors[direction] = door
+        setattr(self, DOOR_SLOTS[direction], door)
     def get_coord(self):
         return self.coord
     def get_neighbors(self):
@@ -63,19 +140,26 @@ class Cell(object):
     def get_distance(self):
         return self.distance
     def set_under_cell(self, other):
-        self.under_cell = other
+        self.state.unders.set(self.id, other)
     def get_under_cell(self):
-        return self.under_cell
+        return self.state.unders.get(self.id)
     def has_under_cell(self):
-        return self.under_cell is not None
+        return self.id in self.state.unders
     def is_free_to_use_in_template(self):
         return self.free_template
     def is_free_to_link(self):
         return self.free_link
     def lock_template(self):
-        self.free_template = False
+        if self.free_template:
+            self.free_template = False
+            if self.state.template_locks is not None:
+                self.state.template_locks.lock(self.id)
+            if self.state.walk_masks is not None:
+                self.state.walk_masks.locked(self.id)
     def lock_link(self):
         self.free_link = False
+        if self.state.walk_masks is not None:
+            self.state.walk_masks.locked(self.id)
 
 class TestCell(unittest.TestCase):
    def setUp(self):
@@ -88,6 +172,22 @@ class TestCell(unittest.TestCase):
       self.assertEqual(self.a.get_color(), 8)
       self.assertTrue(self.a.is_color(8))
       self.assertFalse(self.a.is_color(3))
+   def test_repaint(self):
+      palette = Palette()
+      b = Cell(Coord(0, 0), 'Z', 1, palette)
+      c = Cell(Coord(0, 1), 'Z', 2, palette)
+      b.set_color(4)
+      palette.repaint(9)
+      self.assertEqual(b.get_color(), 9)
+      self.assertTrue(c.is_color(9))
+      c.set_color(2)
+      self.assertEqual(c.get_color(), 2)
+      self.assertEqual(b.get_color(), 9)
+      self.assertEqual(palette.token(), (1, 1))
+      palette.repaint(0)
+      self.assertEqual(palette.token(), ('fresh', 0))
+      self.assertEqual(c.get_color(), 0)
+      self.assertEqual(self.a.get_color(), 0) # a has a palette of its own
    def test_no_get_doors(self):
       doors = self.a.get_doors()
       self.assertEqual(doors, [])
@@ -112,6 +212,16 @@ class TestCell(unittest.TestCase):
    def test_get_id(self):
       b = Cell(Coord(8, 13))
       self.assertNotEqual(self.a.get_id(), b.get_id())
+   def test_slots(self):
+      self.assertFalse(hasattr(self.a, '__dict__'))
+      self.assertFalse(hasattr(UnderCell(self.a), '__dict__'))
+      self.assertEqual(self.a.doors, (None, None, None, None))
+      self.a.add_door(WEST, DoorModule.DoorToTheOutside(self.a, WEST))
+      self.assertEqual(self.a.get_mask(), 1 << WEST)
+      self.assertRaises(AttributeError, setattr, self.a, 'doors', [])
+   def test_given_id(self):
+      self.assertEqual(Cell(Coord(1, 1), 'Z', 7).get_id(), 7)
+      self.assertEqual(Cell(Coord(1, 1), 'Z', 0).get_id(), 0)
    def test_get_id_grid(self):
       height = 3
       width = 3
@@ -131,12 +241,19 @@ class TestCell(unittest.TestCase):
          self.assertFalse(self.a.is_free_to_link())
 
 class UnderCell(Cell):
-   def __init__(self, over_cell):
-       Cell.__init__(self, over_cell.coord, over_cell.zone)
+   __slots__ = ('over_cell',)
+   def __init__(self, over_cell, cell_id=None):
+       Cell.__init__(self, over_cell.coord, over_cell.zone, cell_id, over_cell.palette, over_cell.state)
        over_cell.set_under_cell(self)
        self.over_cell = over_cell
    def __str__(self):
       return 'UnderCell%s%s' % (self.zone, self.coord)
+   def set_under_cell(self, other):
+       pass # under cells are never woven themselves
+   def get_under_cell(self):
+       return None
+   def has_under_cell(self):
+       return False
 
 
 class TestUnderCell(unittest.TestCase):
@@ -147,4 +264,17 @@ class TestUnderCell(unittest.TestCase):
         self.assertEqual(str(self.under), 'UnderCell(8,13)')
     def test_linkage(self):
         self.assertEqual(self.over.get_under_cell(), self.under)
+    def test_overlay(self):
+        (palette, state) = (Palette(), GridState())
+        over = Cell(Coord(1, 2), 'Z', 5, palette, state)
+        plain = Cell(Coord(1, 3), 'Z', 6, palette, state)
+        under = UnderCell(over, 20)
+        self.assertEqual(state.unders.under_cells(), [under])
+        self.assertTrue(state.unders.get(5) is under)
+        self.assertTrue(under.palette is palette and under.state is state)
+        self.assertFalse(plain.has_under_cell())
+        self.assertFalse(under.has_under_cell())
+        over.set_under_cell(None)
+        self.assertEqual(len(state.unders), 0)
+        self.assertFalse(hasattr(palette, 'unders')) # colours only
 
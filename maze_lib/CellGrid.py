@@ -0,0 +1,163 @@
+import unittest
+from Coord import *
+from Cell import *
+from Door import *
+from TemplateLocks import *
+from WalkMasks import *
+
+class CellCoords(CoordPool):
+    '''Every cell already holds its Coord, so hand those out rather than making copies.'''
+    def __init__(self, grid):
+        CoordPool.__init__(self, grid.height, grid.width)
+        self.grid = grid
+    def coord(self, index):
+        return self.grid.cell_at(index).coord
+
+class CellGrid(list):
+    '''The original storage: a list of rows of full Cell objects.'''
+    def __init__(self, height, width, zone):
+        self.palette = Palette()
+        self.state = GridState() # under cells, template locks and walk masks
+        # cell ids are dense: x*width+y for the grid, then size onwards for under cells
+        list.__init__(self, [[Cell(Coord(x, y), zone, (x * width) + y, self.palette, self.state) for y in range(width)] for x in range(height)])
+        self.height = height
+        self.width = width
+        self.zone = zone
+        self.size = height * width
+        self.under_cells = [] # in id order; the state's overlay finds them by over cell
+        self.coords = CellCoords(self)
+    def cell(self, x, y):
+        return self[x][y]
+    def cell_at(self, index):
+        return self[index // self.width][index % self.width]
+    def view(self, cell_id):
+        '''The cell with cell_id, under cells included.'''
+        if cell_id < self.size:
+            return self.cell_at(cell_id)
+        return self.under_cells[cell_id - self.size]
+    def add_door(self, coord, direction):
+        self.add_door_at(coord.x * self.width + coord.y, direction)
+    def add_door_at(self, index, direction):
+        start = self.cell_at(index)
+        end = self.cell_at(self.coords.step(index, direction))
+        door = Door(start, direction, end)
+        start.add_door(direction, door)
+        end.add_door(opposite_direction(direction), door)
+        if self.state.walk_masks is not None:
+            self.state.walk_masks.door_added(index, direction)
+    def add_doors(self, walls):
+        '''add_door_at for many walls, numbered as in Maze.nextdoor_edge_ids (cell*2 north, cell*2+1 east).'''
+        if self.state.walk_masks is not None: # keep the walk masks told of every door
+            for wall in walls:
+                self.add_door_at(int(wall) >> 1, EAST if wall & 1 else NORTH)
+            return
+        cells = [c for row in self for c in row]
+        width = self.width
+        for wall in (walls.tolist() if hasattr(walls, 'tolist') else walls):
+            start = cells[wall >> 1]
+            if wall & 1:
+                end = cells[(wall >> 1) + 1]
+                door = Door(start, EAST, end)
+                start.add_door(EAST, door)
+                end.add_door(WEST, door)
+            else:
+                end = cells[(wall >> 1) - width]
+                door = Door(start, NORTH, end)
+                start.add_door(NORTH, door)
+                end.add_door(SOUTH, door)
+    def add_under_door(self, under_cell, direction):
+        destination = under_cell.get_coord().step(direction)
+        end = self[destination.x][destination.y]
+        door = Door(under_cell, direction, end)
+        under_cell.add_door(direction, door)
+        end.add_door(opposite_direction(direction), door)
+        if self.state.walk_masks is not None:
+            self.state.walk_masks.under_door_added(under_cell.over_cell.id, direction)
+    def remove_door(self, coord, direction):
+        first = self[coord.x][coord.y]
+        destination = coord.step(direction)
+        second = self[destination.x][destination.y]
+        first.add_door(direction, None)
+        second.add_door(opposite_direction(direction), None)
+        if self.state.walk_masks is not None:
+            self.state.walk_masks.door_removed(first.id, direction)
+    def new_under_cell(self, over_cell):
+        under_cell = UnderCell(over_cell, self.cell_count())
+        self.under_cells.append(under_cell)
+        return under_cell
+    def cell_count(self):
+        '''Every cell id, under cells included, is below this.'''
+        return self.size + len(self.under_cells)
+    def woven_cells(self):
+        '''The over cells that have an under cell, in the order they were woven.'''
+        return [under.over_cell for under in self.under_cells]
+    def door_masks(self):
+        '''The door mask of every grid cell, in id order.'''
+        return bytearray(c.get_mask() for row in self for c in row)
+    def under_masks(self):
+        '''(over cell id, under cell id, door mask) of each under cell, in id order.'''
+        return [(u.over_cell.id, u.id, u.get_mask()) for u in self.under_cells]
+    def template_locks(self):
+        '''The cells' template locks as arrays; kept up to date by lock_template once made.'''
+        if self.state.template_locks is None:
+            locked = [c.id for row in self for c in row if not c.free_template]
+            self.state.template_locks = TemplateLocks(self.height, self.width, locked)
+        return self.state.template_locks
+    def free_template_index(self):
+        return self.template_locks().free
+    def walk_masks(self):
+        '''The cells' WalkMasks; kept up to date by the cells and doors once made.'''
+        if self.state.walk_masks is None:
+            self.state.walk_masks = WalkMasks(self, self.palette.background if self.palette.painted == 0 else None)
+        return self.state.walk_masks
+    def drop_walk_masks(self):
+        self.state.walk_masks = None
+    def color_all(self, color):
+        self.palette.repaint(color) # under cells share the palette
+        if self.state.walk_masks is not None:
+            self.state.walk_masks.repainted(color)
+    def paint_token(self):
+        return self.palette.token()
+    def get_all_color(self, color):
+        return [cell for row in self for cell in row if cell.is_color(color)]
+
+class TestCellGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = CellGrid(3, 4, 'G')
+    def test_shape(self):
+        self.assertEqual(len(self.grid), 3)
+        self.assertEqual(len(self.grid[0]), 4)
+        self.assertEqual(self.grid.cell(2, 3).get_coord(), Coord(2, 3))
+        self.assertTrue(self.grid.coords.coord(11) is self.grid.cell_at(11).get_coord())
+    def test_dense_ids(self):
+        self.assertEqual([c.get_id() for row in self.grid for c in row], list(range(12)))
+        self.assertEqual(CellGrid(3, 4, 'H').cell(2, 1).get_id(), self.grid.cell(2, 1).get_id())
+        self.assertEqual(self.grid.new_under_cell(self.grid.cell(1, 2)).get_id(), 12)
+        self.assertEqual(self.grid.new_under_cell(self.grid.cell(1, 1)).get_id(), 13)
+        self.assertEqual(self.grid.cell_count(), 14)
+        self.assertEqual(self.grid.view(13), self.grid.cell(1, 1).get_under_cell())
+        self.assertEqual(self.grid.view(6), self.grid.cell(1, 2))
+        self.assertEqual(self.grid.woven_cells(), [self.grid.cell(1, 2), self.grid.cell(1, 1)])
+        self.assertTrue(self.grid.cell(1, 1).has_under_cell())
+        self.assertFalse(self.grid.cell(1, 0).has_under_cell())
+    def test_add_remove_door(self):
+        self.grid.add_door(Coord(1, 1), EAST)
+        self.assertEqual(self.grid.cell(1, 1).get_neighbors(), [self.grid.cell(1, 2)])
+        self.grid.remove_door(Coord(1, 2), WEST)
+        self.assertEqual(self.grid.cell(1, 1).get_neighbors(), [])
+    def test_free_template_index(self):
+        self.grid.cell(0, 1).lock_template()
+        free = self.grid.free_template_index()
+        self.assertEqual(len(free), 11)
+        self.grid.cell(2, 3).lock_template()
+        self.grid.new_under_cell(self.grid.cell(1, 1)).lock_template()
+        self.assertEqual(len(free), 10)
+        self.assertFalse(11 in free)
+    def test_color_all(self):
+        under = self.grid.new_under_cell(self.grid.cell(1, 1))
+        under.set_color(3)
+        self.grid.color_all(4)
+        self.assertEqual(under.get_color(), 4)
+        self.grid.cell(0, 0).set_color(2)
+        self.assertEqual(len(self.grid.get_all_color(4)), 11)
+        self.assertEqual(self.grid.get_all_color(2), [self.grid.cell(0, 0)])
@@ -1,4 +1,6 @@
 import unittest
+from array import array
+from MemoryUse import deep_sizeof
 
 # directions
 NORTH = 0
@@ -11,6 +13,7 @@ def opposite_direction(direction):
 
 
 class Coord(object):
+    __slots__ = ('x', 'y')
     def __init__(self, x, y):
         self.x = int(x)
         self.y = int(y)
@@ -18,6 +21,10 @@ class Coord(object):
         return (self.x == other.x) and (self.y == other.y)
     def __ne__(self, other):
         return not self.__eq__(other)
+    def __hash__(self):
+        return hash((self.x, self.y))
+    def pack(self, width):
+        return self.x * width + self.y
     def step(self, direction):
         new_x = self.x + (-1,  0, +1,  0)[direction]
         new_y = self.y + ( 0, +1,  0, -1)[direction]
@@ -50,6 +57,59 @@ class Coord(object):
         return Coord(new_x, new_y)
 
 
+def unpack_coord(index, width):
+    return Coord(index // width, index % width)
+
+def nextdoor_edge_ids(height, width):
+    '''
+    Every wall between two cells of a height x width grid as an array('i'):
+    cell*2 is the wall north of cell, cell*2+1 the wall east of it.
+    '''
+    row = 2 * width
+    ids = array('i', range(1, row - 1, 2)) # the top row has no walls to the north
+    for x in range(1, height):
+        ids.extend(range(x * row, (x + 1) * row - 1)) # all but the wall east of the last column
+    return ids
+
+class CoordPool(object):
+    '''
+    Coords for one maze size, keyed by their packed x*width+y index.
+    Coords are only made when asked for, so hot loops can run on the indices,
+    and none are kept: a packed grid would otherwise grow a Coord for every
+    cell it ever handed out, many times the bytes of the grid itself.
+    '''
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.size = height * width
+    def index(self, coord):
+        return coord.x * self.width + coord.y
+    def coord(self, index):
+        return unpack_coord(index, self.width)
+    def coord_at(self, x, y):
+        return self.coord(x * self.width + y)
+    def step(self, index, direction):
+        '''Index of the next cell in direction, or -1 past the edge.'''
+        if direction == NORTH:
+            return index - self.width if index >= self.width else -1
+        if direction == SOUTH:
+            return index + self.width if index + self.width < self.size else -1
+        if direction == EAST:
+            return index + 1 if (index % self.width) != self.width - 1 else -1
+        return index - 1 if (index % self.width) != 0 else -1
+    def direction_between(self, index, other):
+        delta = other - index
+        if delta == self.width:
+            return SOUTH
+        if delta == -self.width:
+            return NORTH
+        if index // self.width == other // self.width:
+            if delta == 1:
+                return EAST
+            if delta == -1:
+                return WEST
+        raise Exception('Coordinates are not adjacent!')
+
 class TestCoord(unittest.TestCase):
     def test_eq(self):
         a = Coord(1, 4)
@@ -88,3 +148,41 @@ class TestCoord(unittest.TestCase):
         a2 = start.shift(0, 1)
         e2 = Coord(7, 8)
         self.assertEqual(a2, e2)
+    def test_hash(self):
+        seen = set([Coord(1, 4), Coord(4, 1)])
+        self.assertTrue(Coord(1, 4) in seen)
+        self.assertFalse(Coord(1, 5) in seen)
+        self.assertEqual({Coord(2, 3): 'a'}[Coord(2, 3)], 'a')
+    def test_slots(self):
+        self.assertRaises(AttributeError, setattr, Coord(1, 1), 'z', 0)
+    def test_nextdoor_edge_ids(self):
+        self.assertEqual(list(nextdoor_edge_ids(2, 3)), [1, 3, 6, 7, 8, 9, 10])
+        self.assertEqual(len(nextdoor_edge_ids(5, 7)), 5 * 6 + 4 * 7)
+    def test_pack(self):
+        self.assertEqual(Coord(3, 4).pack(10), 34)
+        self.assertEqual(unpack_coord(34, 10), Coord(3, 4))
+        self.assertEqual(unpack_coord(Coord(6, 0).pack(7), 7), Coord(6, 0))
+
+class TestCoordPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = CoordPool(4, 5)
+    def test_coord(self):
+        a = self.pool.coord(7)
+        self.assertEqual(a, Coord(1, 2))
+        self.assertEqual(self.pool.coord_at(1, 2), a)
+        self.assertEqual(self.pool.index(a), 7)
+        before = deep_sizeof(self.pool)
+        coords = [self.pool.coord(i) for i in range(self.pool.size)]
+        self.assertEqual(deep_sizeof(self.pool), before) # nothing kept
+    def test_step(self):
+        for index in range(self.pool.size):
+            coord = self.pool.coord(index)
+            for d in range(4):
+                next_coord = coord.step(d)
+                inside = 0 <= next_coord.x < 4 and 0 <= next_coord.y < 5
+                expected = self.pool.index(next_coord) if inside else -1
+                self.assertEqual(self.pool.step(index, d), expected)
+    def test_direction_between(self):
+        for d in range(4):
+            self.assertEqual(self.pool.direction_between(7, self.pool.step(7, d)), d)
+        self.assertRaises(Exception, self.pool.direction_between, 4, 5) # end of one row to the start of the next
@@ -0,0 +1,80 @@
+import unittest
+from array import array
+
+class DisjointSet(object):
+    '''
+    Union-find over the ids 0..size-1, with path compression and union by size,
+    so find and union are near-constant time however large the maze.
+    '''
+    def __init__(self, size):
+        self.parent = array('i', range(size))
+        self.sizes = array('i', [1]) * size
+        self.count = size # number of disjoint sets
+    @classmethod
+    def single(cls, size):
+        '''The ids 0..size-1 all in one set, as a finished maze leaves them.'''
+        sets = cls(0)
+        sets.parent = array('i', [0]) * size
+        sets.sizes = array('i', [0]) * size
+        if size:
+            sets.sizes[0] = size
+        sets.count = 1 if size else 0
+        return sets
+    def find(self, i):
+        '''The representative id of the set holding i.'''
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root: # compress the path just walked
+            (parent[i], i) = (root, parent[i])
+        return root
+    def union(self, i, j):
+        '''Merge the sets holding i and j; False if they were already one set.'''
+        i = self.find(i)
+        j = self.find(j)
+        if i == j:
+            return False
+        if self.sizes[i] < self.sizes[j]:
+            (i, j) = (j, i)
+        self.parent[j] = i
+        self.sizes[i] += self.sizes[j]
+        self.count -= 1
+        return True
+    def same(self, i, j):
+        return self.find(i) == self.find(j)
+    def set_size(self, i):
+        return self.sizes[self.find(i)]
+
+class TestDisjointSet(unittest.TestCase):
+    def test_single(self):
+        s = DisjointSet.single(5)
+        self.assertEqual(s.count, 1)
+        self.assertTrue(s.same(0, 4))
+        self.assertEqual(s.set_size(3), 5)
+        self.assertFalse(s.union(1, 2))
+    def test_union_find(self):
+        s = DisjointSet(6)
+        self.assertEqual(s.count, 6)
+        self.assertTrue(s.union(0, 1))
+        self.assertTrue(s.union(2, 3))
+        self.assertFalse(s.union(1, 0))
+        self.assertTrue(s.same(0, 1))
+        self.assertFalse(s.same(1, 2))
+        self.assertTrue(s.union(3, 1))
+        self.assertTrue(s.same(0, 2))
+        self.assertEqual(s.set_size(3), 4)
+        self.assertEqual(s.count, 3)
+        self.assertEqual(s.find(5), 5)
+    def test_union_by_size(self):
+        s = DisjointSet(5)
+        s.union(0, 1)
+        s.union(0, 2)
+        s.union(3, 0) # the bigger set's root stays the root
+        self.assertEqual(s.find(3), s.find(0))
+        self.assertEqual(s.parent[3], s.find(0))
+    def test_path_compression(self):
+        s = DisjointSet(4)
+        s.parent = array('i', [0, 0, 1, 2]) # a chain 3->2->1->0
+        self.assertEqual(s.find(3), 0)
+        self.assertEqual(list(s.parent), [0, 0, 0, 0])
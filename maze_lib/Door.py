@@ -3,6 +3,7 @@ from Coord import *
 import Cell as CellModule
 
 class Door(object):
+   __slots__ = ('start', 'direction', 'end')
    def __init__(self, start, direction, end):
       self.start = start
       self.direction = direction
@@ -41,6 +42,7 @@ class TestDoor(unittest.TestCase):
       self.assertEqual(str(door), 'Door<%s-S-%s>' % (a,b))
 
 class DoorToTheOutside(object):
+   __slots__ = ('start', 'direction')
    def __init__(self, start, direction):
       self.start = start
       self.direction = direction
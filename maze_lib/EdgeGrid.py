@@ -0,0 +1,114 @@
+import unittest
+from Coord import *
+from Door import *
+from PackedGrid import *
+
+class EdgeGrid(PackedGrid):
+    '''
+    PackedGrid variant that stores passages as edges rather than per-cell masks.
+    v_edges holds the height x (width+1) walls between west and east neighbours,
+    h_edges the (height+1) x width walls between north and south neighbours.
+    A passage is a single true edge shared by both cells, so adding or removing
+    one is a single store; the outermost edges are the doors to the outside.
+    Cells are still seen through PackedCell views, whose get_neighbors reads the
+    mask that mask() rebuilds from the four edges around a cell.
+    '''
+    def __init__(self, height, width, zone):
+        PackedGrid.__init__(self, height, width, zone)
+        self.wall_mask = None
+        self.v_edges = bytearray(height * (width + 1))
+        self.h_edges = bytearray((height + 1) * width)
+
+    def edge(self, index, direction):
+        '''(edge array, position) of the wall on the direction side of the cell at index.'''
+        if direction == NORTH:
+            return (self.h_edges, index)
+        if direction == SOUTH:
+            return (self.h_edges, index + self.width)
+        v = index + index // self.width
+        if direction == WEST:
+            return (self.v_edges, v)
+        return (self.v_edges, v + 1)
+
+    def mask(self, index):
+        v = index + index // self.width
+        h = self.h_edges
+        m = h[index] | (self.v_edges[v + 1] << EAST) | (h[index + self.width] << SOUTH) | (self.v_edges[v] << WEST)
+        if self.unders:
+            under = self.unders.get(index)
+            if under is not None:
+                m &= ~under.mask # those edges belong to the under cell
+        return m
+    def set_bit(self, index, direction):
+        (edges, position) = self.edge(index, direction)
+        edges[position] = 1
+    def clear_bit(self, index, direction):
+        (edges, position) = self.edge(index, direction)
+        edges[position] = 0
+
+    def door_masks(self):
+        '''The door mask of every grid cell, in id order.'''
+        return bytearray(self.mask(i) for i in range(self.size))
+
+    def add_door_at(self, index, direction):
+        self.set_bit(index, direction)
+        if self.masks is not None:
+            self.masks.door_added(index, direction)
+    def add_doors(self, walls):
+        '''add_door_at for many walls at once, numbered as for PackedGrid.add_doors.'''
+        if numpy is None or self.masks is not None:
+            PackedGrid.add_doors(self, walls)
+            return
+        north = walls[walls & 1 == 0] >> 1
+        east = walls[walls & 1 == 1] >> 1
+        h = numpy.frombuffer(self.h_edges, dtype=numpy.uint8)
+        v = numpy.frombuffer(self.v_edges, dtype=numpy.uint8)
+        h[north] = 1
+        v[east + east // self.width + 1] = 1
+    def add_under_door(self, under_cell, direction):
+        index = under_cell.index
+        self.unders[index].mask |= 1 << direction
+        self.set_bit(index, direction)
+        if self.masks is not None:
+            self.masks.under_door_added(index, direction)
+    def remove_door(self, coord, direction):
+        index = coord.x * self.width + coord.y
+        self.clear_bit(index, direction)
+        if self.masks is not None:
+            self.masks.door_removed(index, direction)
+
+class TestEdgeGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = EdgeGrid(3, 4, 'E')
+    def test_edges_are_shared(self):
+        self.grid.add_door(Coord(1, 1), EAST)
+        self.grid.add_door(Coord(1, 1), SOUTH)
+        self.assertEqual(sum(self.grid.v_edges) + sum(self.grid.h_edges), 2)
+        self.assertEqual(self.grid.mask(5), (1 << EAST) | (1 << SOUTH))
+        self.assertEqual(self.grid.mask(6), 1 << WEST)
+        self.assertEqual(self.grid.mask(9), 1 << NORTH)
+        self.assertEqual(self.grid.cell(1, 2).get_neighbors(), [self.grid.cell(1, 1)])
+        self.grid.remove_door(Coord(1, 2), WEST)
+        self.assertTrue(self.grid.cell(1, 2).is_unlinked())
+        self.assertEqual(self.grid.cell(1, 1).get_neighbors(), [self.grid.cell(2, 1)])
+    def test_rows_do_not_wrap(self):
+        self.grid.add_door(Coord(0, 3), EAST)
+        self.assertEqual(self.grid.mask(4), 0)
+        self.assertEqual(self.grid.mask(3), 1 << EAST)
+    def test_door_to_the_outside(self):
+        last = self.grid.cell(2, 3)
+        last.add_door(EAST, DoorToTheOutside(last, EAST))
+        self.assertEqual(self.grid.v_edges[-1], 1)
+        self.assertTrue(last.has_door(EAST))
+        self.assertEqual(last.get_neighbors(), [])
+    def test_under_cell(self):
+        self.grid.add_door(Coord(1, 1), EAST)
+        self.grid.add_door(Coord(1, 1), WEST)
+        over = self.grid.cell(1, 1)
+        under = self.grid.new_under_cell(over)
+        self.grid.add_under_door(under, NORTH)
+        self.grid.add_under_door(under, SOUTH)
+        self.assertEqual(over.get_neighbors(), [self.grid.cell(1, 2), self.grid.cell(1, 0)])
+        self.assertEqual(under.get_neighbors(), [self.grid.cell(0, 1), self.grid.cell(2, 1)])
+        self.assertEqual(self.grid.cell(2, 1).get_neighbors(), [under])
+        self.assertEqual(self.grid.door_masks()[4:8], bytearray([2, 10, 8, 0]))
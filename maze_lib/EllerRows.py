@@ -0,0 +1,122 @@
+import unittest
+import random
+from array import array
+from Coord import *
+from MazeRandom import *
+
+# Eller's algorithm builds a perfect maze one row at a time, remembering only which
+# cells of the current row are already joined (by paths through the rows above).
+# Each row gets some east doors between cells not yet joined, then at least one door
+# south out of every set; the last row joins whatever sets are left. Rows come out as
+# array('B') door masks, bit d set for a door in direction d as in Cell.get_mask, so a
+# writer or renderer can take them as they come and the maze never has to be held whole.
+
+def eller_rows(height, width, rng=SHARED_RANDOM):
+    '''
+    The door masks of a height x width Eller maze, row by row from the north; each row
+    an array('B') of width masks. Draws from rng (a MazeRandom) and keeps
+    O(width) memory however many rows there are.
+    '''
+    label = array('i', range(width)) # each cell's set, named by its leftmost cell in the row
+    north = bytearray(width) # the cells with a door up to the row above
+    parent = array('i', range(width))
+    count = array('i', [0]) * width
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for x in range(height):
+        last = x == height - 1
+        masks = array('B', [0]) * width
+        for i in range(width):
+            parent[i] = label[i]
+            if north[i]:
+                masks[i] = 1 << NORTH
+        for i in range(width - 1):
+            (a, b) = (find(i), find(i + 1))
+            if a != b and (last or rng.random() < 0.5):
+                parent[max(a, b)] = min(a, b)
+                masks[i] |= 1 << EAST
+                masks[i + 1] |= 1 << WEST
+        if last:
+            yield masks
+            return
+        for i in range(width):
+            root = find(i)
+            parent[i] = root
+            count[root] += 1
+        first = array('i', [-1]) * width # each set's leftmost cell going south
+        for i in range(width):
+            root = parent[i]
+            count[root] -= 1
+            down = rng.random() < 0.5 or (count[root] == 0 and first[root] < 0) # every set goes on
+            north[i] = down
+            if down:
+                masks[i] |= 1 << SOUTH
+                if first[root] < 0:
+                    first[root] = i
+                label[i] = first[root]
+            else:
+                label[i] = i
+        yield masks
+
+def eller_walls(height, width, rng=SHARED_RANDOM):
+    '''The wall ids (see Maze.nextdoor_edge_ids) an Eller maze opens, as an array('i'); row by row.'''
+    walls = array('i')
+    for (x, masks) in enumerate(eller_rows(height, width, rng)):
+        base = x * width
+        for i in range(width):
+            if masks[i] & (1 << NORTH):
+                walls.append((base + i) * 2)
+            if masks[i] & (1 << EAST):
+                walls.append((base + i) * 2 + 1)
+    return walls
+
+def write_rows_text(rows, out, width):
+    '''Write rows of door masks to out as text, a row at a time, two lines per row of cells.'''
+    out.write('+' + '--+' * width + '\n')
+    for masks in rows:
+        out.write('|' + ''.join('   ' if m & (1 << EAST) else '  |' for m in masks) + '\n')
+        out.write('+' + ''.join('  +' if m & (1 << SOUTH) else '--+' for m in masks) + '\n')
+
+class TestEllerRows(unittest.TestCase):
+    def check_perfect(self, height, width, rows):
+        doors = sum(bin(m).count('1') for masks in rows for m in masks) // 2
+        self.assertEqual(doors, height * width - 1) # a tree, once it is connected
+        parent = list(range(height * width))
+        def find(i):
+            while parent[i] != i:
+                i = parent[i]
+            return i
+        for (x, masks) in enumerate(rows):
+            for y in range(width):
+                if masks[y] & (1 << EAST):
+                    parent[find(x * width + y)] = find(x * width + y + 1)
+                if masks[y] & (1 << SOUTH):
+                    parent[find(x * width + y)] = find((x + 1) * width + y)
+        self.assertEqual(len(set(find(i) for i in range(height * width))), 1)
+    def test_perfect(self):
+        random.seed(8)
+        for (h, w) in [(1, 1), (1, 6), (6, 1), (5, 7), (20, 3), (12, 12)]:
+            self.check_perfect(h, w, list(eller_rows(h, w)))
+    def test_doors_agree(self):
+        rows = list(eller_rows(6, 5, MazeRandom(2)))
+        for x in range(6):
+            for y in range(5):
+                self.assertEqual(bool(rows[x][y] & (1 << SOUTH)), x < 5 and bool(rows[x + 1][y] & (1 << NORTH)))
+                self.assertEqual(bool(rows[x][y] & (1 << EAST)), y < 4 and bool(rows[x][y + 1] & (1 << WEST)))
+        self.assertEqual(list(eller_rows(6, 5, MazeRandom(2))), rows)
+    def test_walls(self):
+        walls = eller_walls(4, 4, MazeRandom(1))
+        self.assertEqual(len(walls), 15)
+        self.assertTrue(all(w >= 8 for w in walls if w % 2 == 0)) # no doors north out of the top row
+    def test_write_text(self):
+        class Out(object):
+            def __init__(self):
+                self.text = ''
+            def write(self, s):
+                self.text += s
+        out = Out()
+        write_rows_text(eller_rows(1, 3), out, 3)
+        self.assertEqual(out.text, '+--+--+--+\n|        |\n+--+--+--+\n')
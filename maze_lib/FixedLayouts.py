@@ -0,0 +1,112 @@
+import unittest
+from array import array
+try:
+   import numpy
+except ImportError:
+   numpy = None # the mazes then lay these layouts one door at a time
+from Coord import *
+
+# The walls the zigzag, zagzig, spiral and double-spiral styles open depend only on
+# the height and width, so they are worked out here as numpy arrays of wall ids and
+# written with one Maze.add_doors call. Walls are numbered as in
+# Maze.nextdoor_edge_ids: cell*2 is the wall north of cell, cell*2+1 the wall east.
+
+def zigzag_walls(height, width):
+    '''Every row open east to west, rows joined at alternate ends, as zigzag_connect_all.'''
+    cells = numpy.arange(height * width, dtype=numpy.int32)
+    east = cells[cells % width != width - 1] * 2 + 1
+    x = numpy.arange(1, height, dtype=numpy.int32) # the row each join leads down to
+    ends = numpy.where(x % 2 == 1, width - 1, 0)
+    return numpy.concatenate((east, (x * width + ends) * 2))
+
+def zagzig_walls(height, width):
+    '''Every column open north to south, columns joined at alternate ends, as zagzig_connect_all.'''
+    north = numpy.arange(width, height * width, dtype=numpy.int32) * 2
+    y = numpy.arange(width - 1, dtype=numpy.int32)
+    ends = numpy.where(y % 2 == 0, height - 1, 0)
+    return numpy.concatenate((north, (ends * width + y) * 2 + 1))
+
+def spiral_walls(height, width):
+    '''
+    The walls mono_spiral_connect_all opens: from the north-west corner down, then
+    turning left at each edge or opened cell, one ring of the grid after another.
+    '''
+    w = width
+    walls = [numpy.zeros(0, dtype=numpy.int32)]
+    k = 0
+    while height - 2 * k > 0 and width - 2 * k > 0:
+        (bottom, right) = (height - 1 - k, width - 1 - k)
+        rows = numpy.arange(k + 1, bottom + 1, dtype=numpy.int32)
+        walls.append((rows * w + k) * 2) # down the west side
+        if right == k:
+            break
+        walls.append((bottom * w + numpy.arange(k, right, dtype=numpy.int32)) * 2 + 1) # east along the bottom
+        if bottom == k:
+            break
+        walls.append((rows * w + right) * 2) # up the east side
+        walls.append((k * w + numpy.arange(k + 1, right, dtype=numpy.int32)) * 2 + 1) # west along the top
+        if bottom - k >= 2 and right - k >= 2:
+            walls.append(numpy.array([((k + 1) * w + k + 1) * 2], dtype=numpy.int32)) # on to the next ring
+        k += 1
+    return numpy.concatenate(walls)
+
+def double_spiral_walls(height, width):
+    '''The walls bi_spiral_connect_all opens; see double_spiral_trace.'''
+    return double_spiral_trace(height, width)[0]
+
+def double_spiral_trace(height, width):
+    '''
+    The walls bi_spiral_connect_all opens, and the cells its arms never stepped out
+    of (the ones it leaves unpainted), as an array of ids. The two
+    arms take turns and bend around each other wherever they happen to meet, so
+    there is no ring-by-ring formula; the arms are traced over a bytearray of
+    visited cells instead of the cells.
+    '''
+    (w, size) = (width, height * width)
+    visited = bytearray(size)
+    walls = array('i')
+    current = [0, size - 1]
+    direction = [SOUTH, NORTH]
+    ab = 0
+    def step(i, d):
+        if d == NORTH:
+            return i - w if i >= w else -1
+        if d == SOUTH:
+            return i + w if i + w < size else -1
+        if d == EAST:
+            return i + 1 if i % w != w - 1 else -1
+        return i - 1 if i % w else -1
+    for n in range(size - 1):
+        i = current[ab]
+        visited[i] = 1
+        d = direction[ab]
+        j = step(i, d)
+        if j < 0:
+            d = (d + 3) % 4
+            j = step(i, d)
+            assert j >= 0
+        if visited[j]:
+            d = (d + 3) % 4
+            j = step(i, d)
+        assert j >= 0
+        walls.append((i * 2, i * 2 + 1, j * 2, j * 2 + 1)[d])
+        (current[ab], direction[ab]) = (j, d)
+        ab = 1 - ab
+    left = numpy.flatnonzero(numpy.frombuffer(bytes(visited), dtype=numpy.uint8) == 0)
+    return (numpy.array(walls, dtype=numpy.int32), left)
+
+@unittest.skipIf(numpy is None, 'the fixed layouts need numpy')
+class TestFixedLayouts(unittest.TestCase):
+    def test_zigzag(self):
+        self.assertEqual(sorted(zigzag_walls(3, 3)), [1, 3, 7, 9, 10, 12, 13, 15])
+        self.assertEqual(sorted(zagzig_walls(3, 3)), [3, 6, 8, 10, 12, 13, 14, 16])
+    def test_spiral(self):
+        # 3x3: down the west side, along the bottom, up the east side, west to the middle of the top, down
+        self.assertEqual(list(spiral_walls(3, 3)), [6, 12, 13, 15, 10, 16, 3, 8])
+        self.assertEqual(len(spiral_walls(1, 5)), 4)
+        self.assertEqual(len(spiral_walls(6, 1)), 5)
+    def test_double_spiral_end(self):
+        self.assertEqual(list(double_spiral_trace(1, 1)[1]), [0])
+        self.assertEqual(list(double_spiral_trace(2, 2)[1]), [1]) # where the second arm stopped
+        (walls, left) = double_spiral_trace(3, 3)
+        self.assertEqual((len(walls), list(left)), (8, [4])) # the arms meet in the middle
@@ -0,0 +1,68 @@
+import unittest
+import random
+from array import array
+from MazeRandom import *
+
+class FreeCellIndex(object):
+    '''
+    The grid cell ids, 0..size-1, that are still free, packed densely so that
+    picking one uniformly at random and discarding one are both O(1).
+    '''
+    def __init__(self, size, free_ids=None):
+        if free_ids is None:
+            self.ids = array('i', range(size))
+            self.position = array('i', range(size))
+        else:
+            self.ids = array('i', free_ids)
+            self.position = array('i', [-1]) * size # where each id sits in ids, -1 once taken
+            for (p, i) in enumerate(self.ids):
+                self.position[i] = p
+    def __len__(self):
+        return len(self.ids)
+    def __contains__(self, i):
+        return 0 <= i < len(self.position) and self.position[i] >= 0
+    def discard(self, i):
+        '''Take i out of the index; ids it never held (under cells, say) are ignored.'''
+        if i not in self:
+            return
+        p = self.position[i]
+        last = self.ids.pop()
+        if last != i:
+            self.ids[p] = last
+            self.position[last] = p
+        self.position[i] = -1
+    def pick(self, rng=SHARED_RANDOM):
+        '''A uniformly random free id, or None when there are none left.'''
+        if len(self.ids) == 0:
+            return None
+        return self.ids[rng.randrange(len(self.ids))]
+
+class TestFreeCellIndex(unittest.TestCase):
+    def test_discard(self):
+        index = FreeCellIndex(5)
+        index.discard(1)
+        index.discard(4)
+        index.discard(1)
+        index.discard(9)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(sorted(index.ids), [0, 2, 3])
+        self.assertFalse(1 in index)
+        self.assertTrue(3 in index)
+    def test_built_from_free_ids(self):
+        index = FreeCellIndex(6, [5, 2])
+        self.assertEqual(len(index), 2)
+        self.assertFalse(0 in index)
+        index.discard(5)
+        self.assertEqual(list(index.ids), [2])
+        self.assertEqual(index.pick(), 2)
+        index.discard(2)
+        self.assertEqual(index.pick(), None)
+    def test_pick_is_uniform(self):
+        random.seed(3)
+        index = FreeCellIndex(4)
+        index.discard(0)
+        counts = [0] * 4
+        for _ in range(3000):
+            counts[index.pick()] += 1
+        self.assertEqual(counts[0], 0)
+        self.assertTrue(min(counts[1:]) > 900)
@@ -0,0 +1,136 @@
+import unittest
+import math
+from abc import ABCMeta, abstractmethod
+from Coord import *
+
+class ImplicitMaze(object):
+    '''
+    A maze whose doors follow from the coordinates, with no grid behind it. The
+    zigzag, zagzig and spiral layouts are each one path through every cell, so a
+    subclass only says where each cell comes on that path (rank) and which cell
+    comes at a given place (coord_at); two neighbours share a door exactly when
+    their ranks are one apart. Answers the Maze queries get, has_door,
+    get_neighbors and path_from_to; the path between two cells is the stretch of
+    the one path between them, found with O(path) work. Only the subclasses can
+    be made.
+    '''
+    __metaclass__ = ABCMeta
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+    @abstractmethod
+    def rank(self, x, y):
+        '''Where the cell at (x, y) comes on the path, from 0.'''
+    @abstractmethod
+    def coord_at(self, rank):
+        '''(x, y) of the cell at rank.'''
+    def is_valid_coord(self, coord):
+        return 0 <= coord.x < self.height and 0 <= coord.y < self.width
+
+    def get(self, coord):
+        return ImplicitCell(self, coord)
+    def has_door(self, coord, direction):
+        other = coord.step(direction)
+        return self.is_valid_coord(other) and abs(self.rank(other.x, other.y) - self.rank(coord.x, coord.y)) == 1
+    def get_neighbors(self, coord):
+        return [self.get(coord.step(d)) for d in range(4) if self.has_door(coord, d)]
+    def path_from_to(self, from_coord, to_coord, color=None):
+        '''The coords from from_coord to to_coord, both included, as Maze.path_from_to; color is not needed.'''
+        goal = self.rank(to_coord.x, to_coord.y)
+        here = self.rank(from_coord.x, from_coord.y)
+        toward = 1 if goal > here else -1
+        return [from_coord] + [Coord(*self.coord_at(r)) for r in range(here + toward, goal + toward, toward)]
+
+class ImplicitCell(object):
+    '''A cell of an ImplicitMaze: just enough of Cell to ask about its doors.'''
+    def __init__(self, maze, coord):
+        self.maze = maze
+        self.coord = coord
+    def __eq__(self, other):
+        return isinstance(other, ImplicitCell) and self.maze is other.maze and self.coord == other.coord
+    def __ne__(self, other):
+        return not self == other
+    def __repr__(self):
+        return 'ImplicitCell%s' % (self.coord,)
+    def get_coord(self):
+        return self.coord
+    def has_door(self, direction):
+        return self.maze.has_door(self.coord, direction)
+    def get_mask(self):
+        return sum(1 << d for d in range(4) if self.has_door(d))
+    def get_door_count(self):
+        return len([d for d in range(4) if self.has_door(d)])
+    def get_neighbors(self):
+        return self.maze.get_neighbors(self.coord)
+
+class ImplicitZigZag(ImplicitMaze):
+    '''zigzag_connect_all: each row in turn, the even ones west to east.'''
+    def rank(self, x, y):
+        return x * self.width + (y if x % 2 == 0 else self.width - 1 - y)
+    def coord_at(self, rank):
+        (x, y) = divmod(rank, self.width)
+        return (x, y if x % 2 == 0 else self.width - 1 - y)
+
+class ImplicitZagZig(ImplicitMaze):
+    '''zagzig_connect_all: each column in turn, the even ones north to south.'''
+    def rank(self, x, y):
+        return y * self.height + (x if y % 2 == 0 else self.height - 1 - x)
+    def coord_at(self, rank):
+        (y, x) = divmod(rank, self.height)
+        return (x if y % 2 == 0 else self.height - 1 - x, y)
+
+class ImplicitSpiral(ImplicitMaze):
+    '''mono_spiral_connect_all: ring by ring, each down its west side, along the bottom, up and back along the top.'''
+    def rank(self, x, y):
+        (h, w) = (self.height, self.width)
+        k = min(x, y, h - 1 - x, w - 1 - y)
+        (bottom, right) = (h - 1 - k, w - 1 - k)
+        (r, c) = (bottom - k, right - k) # the ring's rows and columns, less one
+        before = h * w - (h - 2 * k) * (w - 2 * k) # cells in the outer rings
+        if y == k:
+            return before + x - k
+        if x == bottom:
+            return before + r + y - k
+        if y == right:
+            return before + r + c + bottom - x
+        return before + 2 * r + c + right - y
+    def coord_at(self, rank):
+        (h, w) = (self.height, self.width)
+        # ring k holds the ranks from h*w - (h-2k)*(w-2k) on: take the root, then mend any rounding
+        k = int(((h + w) - math.sqrt((h - w) ** 2 + 4 * (h * w - rank))) / 4)
+        while k > 0 and h * w - (h - 2 * k) * (w - 2 * k) > rank:
+            k -= 1
+        while h - 2 * (k + 1) > 0 and w - 2 * (k + 1) > 0 and h * w - (h - 2 * k - 2) * (w - 2 * k - 2) <= rank:
+            k += 1
+        (bottom, right) = (h - 1 - k, w - 1 - k)
+        (r, c) = (bottom - k, right - k)
+        place = rank - (h * w - (h - 2 * k) * (w - 2 * k))
+        if place <= r:
+            return (k + place, k)
+        if place <= r + c:
+            return (bottom, k + place - r)
+        if place <= 2 * r + c:
+            return (bottom - (place - r - c), right)
+        return (k, right - (place - 2 * r - c))
+
+class TestImplicitMaze(unittest.TestCase):
+    def test_zigzag(self):
+        m = ImplicitZigZag(3, 4)
+        self.assertEqual([m.rank(1, y) for y in range(4)], [7, 6, 5, 4])
+        self.assertTrue(m.has_door(Coord(0, 3), SOUTH))
+        self.assertFalse(m.has_door(Coord(0, 0), SOUTH))
+        self.assertFalse(m.has_door(Coord(2, 3), EAST))
+        self.assertEqual(m.get(Coord(1, 0)).get_mask(), (1 << SOUTH) | (1 << EAST))
+    def test_ranks(self):
+        for cls in [ImplicitZigZag, ImplicitZagZig, ImplicitSpiral]:
+            for (h, w) in [(1, 1), (1, 5), (5, 1), (4, 4), (5, 7), (8, 3)]:
+                m = cls(h, w)
+                self.assertEqual(sorted(m.rank(x, y) for x in range(h) for y in range(w)), list(range(h * w)), cls)
+                self.assertEqual([m.rank(*m.coord_at(r)) for r in range(h * w)], list(range(h * w)), cls)
+    def test_only_layouts_are_made(self):
+        self.assertRaises(TypeError, ImplicitMaze, 3, 4)
+    def test_path_from_to(self):
+        m = ImplicitZagZig(3, 3)
+        self.assertEqual(m.path_from_to(Coord(2, 1), Coord(1, 0)), [Coord(2, 1), Coord(2, 0), Coord(1, 0)])
+        self.assertEqual(m.path_from_to(Coord(1, 1), Coord(1, 1)), [Coord(1, 1)])
+        self.assertEqual([c.get_coord() for c in m.get_neighbors(Coord(0, 1))], [Coord(0, 2), Coord(1, 1)])
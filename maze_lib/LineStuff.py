@@ -3,6 +3,7 @@ import math
 from Coord import *
 
 class Point(object):
+    __slots__ = ('x', 'y')
     def __init__(self, x, y):
         self.x = float(x)
         self.y = float(y)
@@ -47,6 +48,7 @@ class TestPoint(unittest.TestCase):
         self.assertFalse(p3.touches(p2))
 
 class DirectionVector(object):
+    __slots__ = ('p0', 'p1', 'delta_x', 'delta_y')
     def __init__(self, p0, p1):
         self.p0 = p0
         self.p1 = p1
@@ -84,6 +86,7 @@ def near_zero(x):
     return abs(x) < 0.00001
 
 class Line(object):
+    __slots__ = ('p1', 'p2', 'dv', 'debug')
     def __init__(self, p1, p2):
         self.p1 = p1
         self.p2 = p2
@@ -0,0 +1,96 @@
+import unittest
+import random
+import binascii
+import itertools
+from array import array
+try:
+   import numpy
+except ImportError:
+   numpy = None # bulk draws then come from the Python generator
+from Coord import *
+
+class MazeRandom(random.Random):
+    '''
+    A random generator a maze owns, so mazes built side by side each replay from
+    their own seed. MazeRandom(seed) draws exactly what random.seed(seed) made
+    the module functions draw, but the template styles and weaves now pick
+    cells free for templates straight from their index, with other draws than
+    the old random tries. With replay set they make the old tries instead, so
+    seeds printed before give the same maze; SHARED_RANDOM always replays. The
+    split_tree styles are the exception, as they used to order their work by
+    object address (see PathQueue), so only seeds printed since then replay.
+    With bulk set, the hot loops (shuffle_ids, byte_stream) take their numbers
+    from a numpy RandomState seeded from this generator, in large blocks; that
+    is faster, but a seed then gives other mazes. Without numpy, bulk is ignored.
+    '''
+    def __new__(cls, seed=None, bulk=False, replay=False):
+        return random.Random.__new__(cls, seed)
+    def __init__(self, seed=None, bulk=False, replay=False):
+        random.Random.__init__(self, seed)
+        self.bulk = bulk
+        self.replay = replay
+        self.state = None # the numpy RandomState, once bulk draws are asked for
+
+    def numpy_state(self):
+        '''A numpy RandomState seeded from this generator; one per bulk generator.'''
+        if self.state is None:
+            self.state = numpy.random.RandomState(self.getrandbits(32))
+        return self.state
+    def bulk_draws(self):
+        return self.bulk and numpy is not None
+
+    def shuffle_ids(self, ids):
+        '''Shuffle an array('i') in place; a numpy permutation in bulk.'''
+        if not self.bulk_draws():
+            self.shuffle(ids)
+            return
+        self.numpy_state().shuffle(numpy.frombuffer(ids, dtype=numpy.int32)) # in place, through the array's buffer
+    def byte_buffers(self, size):
+        '''Buffers of size random bytes, each from one draw.'''
+        while True:
+            if self.bulk_draws():
+                yield bytearray(self.numpy_state().bytes(size))
+            else:
+                bits = self.getrandbits(8 * size)
+                yield bytearray(binascii.unhexlify('%0*x' % (2 * size, bits)))
+    def byte_stream(self, size=4096):
+        '''An endless iterator of random bytes, drawn a buffer at a time.'''
+        return itertools.chain.from_iterable(self.byte_buffers(size))
+
+class SharedRandom(MazeRandom):
+    '''
+    The module-level random stream behind the MazeRandom interface: the
+    compatibility mode, and what a maze given no generator uses, so random.seed
+    replays it as it always has. Its draws are the module functions themselves.
+    '''
+    def __init__(self):
+        MazeRandom.__init__(self, replay=True)
+        for name in ['random', 'getrandbits', 'seed', 'getstate', 'setstate',
+                     'randint', 'randrange', 'choice', 'shuffle']:
+            setattr(self, name, getattr(random, name))
+
+SHARED_RANDOM = SharedRandom()
+
+class TestMazeRandom(unittest.TestCase):
+    def draws(self, rng):
+        ids = array('i', range(20))
+        rng.shuffle_ids(ids)
+        return [rng.randint(0, 99), rng.choice('abcdef'), list(ids), list(itertools.islice(rng.byte_stream(8), 12))]
+    def test_replays_module_seed(self):
+        random.seed(12)
+        shared = self.draws(SHARED_RANDOM)
+        self.assertEqual(self.draws(MazeRandom(12)), shared)
+        random.seed(12)
+        random.shuffle(array('i', range(20)))
+        self.assertEqual(random.randint(0, 99), shared[0])
+    def test_independent(self):
+        (a, b) = (MazeRandom(5), MazeRandom(5))
+        first = a.randint(0, 1000)
+        random.seed(99)
+        self.assertEqual(b.randint(0, 1000), first)
+        self.assertEqual(a.random(), b.random())
+    @unittest.skipIf(numpy is None, 'bulk draws need numpy')
+    def test_bulk(self):
+        (a, b) = (MazeRandom(7, True), MazeRandom(7, True))
+        self.assertEqual(self.draws(a), self.draws(b))
+        self.assertEqual(sorted(self.draws(a)[2]), list(range(20)))
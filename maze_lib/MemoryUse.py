@@ -0,0 +1,45 @@
+import unittest
+import sys
+import types
+
+# What a generated 1000x1000 KruskalMaze on the default object grid may hold.
+# Per-cell cost does not depend on the maze size, so tests measure a small maze
+# and scale it up; it has been about 340 bytes/cell since Kruskal's sets
+# became a DisjointSet.
+BUDGET_CELLS = 1000 * 1000
+KRUSKAL_MAZE_BUDGET = 400 * BUDGET_CELLS
+# Bytes per cell a generated PackedGrid may hold: under 20 for a plain maze;
+# a weaved one also keeps an object for each under cell.
+PACKED_GRID_BUDGET = 20
+PACKED_WEAVED_BUDGET = 40
+
+def deep_sizeof(root):
+    '''Bytes held by root and everything reachable from it (classes and modules excluded).'''
+    seen = set()
+    total = 0
+    pending = [root]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pending.extend(obj)
+        if hasattr(obj, '__dict__'):
+            pending.append(obj.__dict__)
+        for name in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, name):
+                pending.append(getattr(obj, name))
+    return total
+
+class TestDeepSizeof(unittest.TestCase):
+    def test_shared_objects_count_once(self):
+        inner = [1, 2, 3]
+        outer = [inner, inner]
+        self.assertEqual(deep_sizeof(outer), sys.getsizeof(outer) + deep_sizeof(inner))
+    def test_follows_dicts(self):
+        self.assertTrue(deep_sizeof({'a': [0] * 100}) > deep_sizeof({'a': []}) + 800)
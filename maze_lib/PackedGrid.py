@@ -0,0 +1,478 @@
+import unittest
+import gc
+from array import array
+try:
+   import numpy
+except ImportError:
+   numpy = None # add_doors then adds one door at a time
+from Coord import *
+from Door import *
+from TemplateLocks import *
+from WalkMasks import *
+
+# bits of PackedGrid.flags
+TEMPLATE_LOCK = 1
+LINK_LOCK = 2
+
+# prev values that are not packed cell references
+PREV_SELF = -1 # a fresh cell's prev is its own coordinate
+PREV_NONE = -2
+
+BIT_COUNT = [bin(mask).count('1') for mask in range(16)]
+
+# byte -> its low / high nibble, for splitting wall_mask with bytearray.translate
+LOW_NIBBLE = bytes(bytearray(b & 0xF for b in range(256)))
+HIGH_NIBBLE = bytes(bytearray(b >> 4 for b in range(256)))
+# flags byte -> 1 if the cell is free to link and free for templates
+UNLOCKED = bytes(bytearray(0 if b & (TEMPLATE_LOCK | LINK_LOCK) else 1 for b in range(256)))
+
+class UnderState(object):
+    '''Everything an under cell stores; weaves are rare so these stay objects.'''
+    __slots__ = ('id', 'mask', 'color', 'stamp', 'prev', 'distance', 'flags')
+    def __init__(self, cell_id, stamp):
+        self.id = cell_id
+        self.mask = 0
+        self.color = 0
+        self.stamp = stamp
+        self.prev = PREV_SELF
+        self.distance = 0
+        self.flags = 0
+
+class PackedGrid(object):
+    '''
+    Grid storage that keeps a 4-bit door mask per cell, two cells to a byte,
+    plus parallel arrays for color, prev, distance and the lock flags.
+    No Cell objects are kept; cell(x, y) returns a PackedCell view.
+    Colors are stamped with an epoch, as with Cell's Palette, so color_all is O(1).
+    '''
+    def __init__(self, height, width, zone):
+        self.height = height
+        self.width = width
+        self.zone = zone
+        self.size = height * width
+        self.coords = CoordPool(height, width)
+        self.wall_mask = bytearray((self.size + 1) // 2) # bit d set means a door in direction d
+        self.colors = array('i', [0]) * self.size
+        self.stamps = array('i', [0]) * self.size
+        self.epoch = 0
+        self.background = 0
+        self.painted = 0 # set_color calls since the last color_all
+        self.prevs = array('i', [PREV_SELF]) * self.size
+        self.distances = array('i', [0]) * self.size
+        self.flags = bytearray(self.size)
+        self.unders = {} # over cell index -> UnderState
+        self.locks = None # a TemplateLocks, once asked for
+        self.masks = None # a WalkMasks, once asked for
+        self.under_index = [] # over cell index of each under cell, in id order
+
+    def __len__(self):
+        return self.height
+    def __getitem__(self, x):
+        if not 0 <= x < self.height:
+            raise IndexError(x)
+        return PackedRow(self, x)
+
+    def cell(self, x, y):
+        return PackedCell(self, x * self.width + y)
+    def cell_at(self, index):
+        return PackedCell(self, index)
+    def view(self, cell_id):
+        if cell_id < self.size:
+            return PackedCell(self, cell_id)
+        return PackedUnderCell(self, self.under_index[cell_id - self.size])
+    def coord_of(self, index):
+        return self.coords.coord(index)
+
+    def mask(self, index):
+        return (self.wall_mask[index >> 1] >> ((index & 1) << 2)) & 0xF
+    def set_bit(self, index, direction):
+        self.wall_mask[index >> 1] |= (1 << direction) << ((index & 1) << 2)
+    def clear_bit(self, index, direction):
+        self.wall_mask[index >> 1] &= ~((1 << direction) << ((index & 1) << 2)) & 0xFF
+
+    def add_door(self, coord, direction):
+        self.add_door_at(coord.x * self.width + coord.y, direction)
+    def add_door_at(self, index, direction):
+        self.set_bit(index, direction)
+        self.set_bit(self.coords.step(index, direction), opposite_direction(direction))
+        if self.masks is not None:
+            self.masks.door_added(index, direction)
+    def add_doors(self, walls):
+        '''
+        add_door_at for many walls at once, numbered as in Maze.nextdoor_edge_ids:
+        cell*2 for the wall north of a cell, cell*2+1 for the one east of it. walls is a
+        numpy array.
+        '''
+        if numpy is None or self.masks is not None: # keep the walk masks told of every door
+            for wall in (walls.tolist() if numpy is not None else walls):
+                self.add_door_at(wall >> 1, EAST if wall & 1 else NORTH)
+            return
+        masks = numpy.zeros(len(self.wall_mask) * 2, dtype=numpy.uint8)
+        masks[:self.size] = numpy.frombuffer(bytes(self.door_masks()), dtype=numpy.uint8)
+        north = walls[walls & 1 == 0] >> 1
+        east = walls[walls & 1 == 1] >> 1
+        masks[north] |= 1 << NORTH
+        masks[north - self.width] |= 1 << SOUTH
+        masks[east] |= 1 << EAST
+        masks[east + 1] |= 1 << WEST
+        self.wall_mask = bytearray((masks[0::2] | (masks[1::2] << 4)).tobytes())
+    def add_under_door(self, under_cell, direction):
+        index = under_cell.index
+        self.unders[index].mask |= 1 << direction
+        self.set_bit(self.coords.step(index, direction), opposite_direction(direction))
+        if self.masks is not None:
+            self.masks.under_door_added(index, direction)
+    def remove_door(self, coord, direction):
+        index = coord.x * self.width + coord.y
+        self.clear_bit(index, direction)
+        self.clear_bit(self.coords.step(index, direction), opposite_direction(direction))
+        if self.masks is not None:
+            self.masks.door_removed(index, direction)
+    def new_under_cell(self, over_cell):
+        self.unders[over_cell.index] = UnderState(self.cell_count(), self.epoch)
+        self.under_index.append(over_cell.index)
+        return PackedUnderCell(self, over_cell.index)
+    def cell_count(self):
+        '''Every cell id, under cells included, is below this.'''
+        return self.size + len(self.under_index)
+    def woven_cells(self):
+        '''The over cells that have an under cell, in the order they were woven.'''
+        return [PackedCell(self, i) for i in self.under_index]
+
+    def door_masks(self):
+        '''The door mask of every grid cell, in id order.'''
+        masks = bytearray(len(self.wall_mask) * 2)
+        masks[0::2] = self.wall_mask.translate(LOW_NIBBLE)
+        masks[1::2] = self.wall_mask.translate(HIGH_NIBBLE)
+        del masks[self.size:]
+        return masks
+    def under_masks(self):
+        '''(over cell index, under cell id, door mask) of each under cell, in id order.'''
+        return [(i, self.unders[i].id, self.unders[i].mask) for i in self.under_index]
+    def template_locks(self):
+        '''The cells' template locks as arrays; kept up to date by lock_template once made.'''
+        if self.locks is None:
+            locked = [i for i in range(self.size) if self.flags[i] & TEMPLATE_LOCK]
+            self.locks = TemplateLocks(self.height, self.width, locked)
+        return self.locks
+    def free_template_index(self):
+        return self.template_locks().free
+    def walk_masks(self):
+        '''The cells' WalkMasks; kept up to date by set_color, the doors and the locks once made.'''
+        if self.masks is None:
+            doors = self.door_masks() if self.wall_mask is not None else None # edge grids read cells as needed
+            free = bytearray(self.flags.translate(UNLOCKED))
+            self.masks = WalkMasks(self, self.background if self.painted == 0 else None, doors, free)
+        return self.masks
+    def drop_walk_masks(self):
+        self.masks = None
+    def color_all(self, color):
+        self.epoch += 1
+        self.background = color
+        self.painted = 0
+        if self.masks is not None:
+            self.masks.repainted(color)
+    def paint_token(self):
+        '''Equal tokens mean equal colors, as with Palette.token.'''
+        if self.painted == 0:
+            return ('fresh', self.background)
+        return (self.epoch, self.painted)
+    def get_color(self, index):
+        if self.stamps[index] == self.epoch:
+            return self.colors[index]
+        return self.background
+    def set_color(self, index, color):
+        self.colors[index] = color
+        self.stamps[index] = self.epoch
+        self.painted += 1
+        if self.masks is not None:
+            self.masks.color_changed(index, color)
+    def get_all_color(self, color):
+        return [PackedCell(self, i) for i in range(self.size) if self.get_color(i) == color]
+
+    def over_neighbor(self, index, direction):
+        '''The cell reached through the door in direction from the over cell at index.'''
+        other = self.coords.step(index, direction)
+        if other < 0:
+            return None # a door to the outside
+        under = self.unders.get(other)
+        if under is not None and under.mask & (1 << opposite_direction(direction)):
+            return PackedUnderCell(self, other)
+        return PackedCell(self, other)
+
+    def encode_prev(self, prev):
+        if prev is None:
+            return PREV_NONE
+        if isinstance(prev, Coord):
+            return (prev.x * self.width + prev.y) << 1
+        return (prev.get_id() << 1) | 1
+    def decode_prev(self, index, code):
+        if code == PREV_SELF:
+            return self.coord_of(index)
+        if code == PREV_NONE:
+            return None
+        if code & 1:
+            return self.view(code >> 1)
+        return self.coord_of(code >> 1)
+
+class PackedRow(object):
+    '''Row x of a PackedGrid; views are only made for the cells actually looked at.'''
+    __slots__ = ('grid', 'start')
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.start = x * grid.width
+    def __len__(self):
+        return self.grid.width
+    def __getitem__(self, y):
+        if not 0 <= y < self.grid.width:
+            raise IndexError(y)
+        return PackedCell(self.grid, self.start + y)
+
+class PackedCell(object):
+    '''A throw-away Cell look-alike over one position of a PackedGrid.'''
+    __slots__ = ('grid', 'index')
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+    def get_id(self):
+        return self.index
+    def __eq__(self, other):
+        return isinstance(other, PackedCell) and self.grid is other.grid and self.get_id() == other.get_id()
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    def __hash__(self):
+        return self.get_id()
+    def __str__(self):
+        return 'Cell_%d%s' % (self.get_id(), self.get_coord())
+    def __repr__(self):
+        return str(self)
+    def get_coord(self):
+        return self.grid.coord_of(self.index)
+    coord = property(get_coord)
+
+    def set_color(self, color):
+        self.grid.set_color(self.index, color)
+    def get_color(self):
+        return self.grid.get_color(self.index)
+    def is_color(self, color):
+        return self.get_color() == color
+    def set_prev(self, prev):
+        self.grid.prevs[self.index] = self.grid.encode_prev(prev)
+    def get_prev(self):
+        return self.grid.decode_prev(self.index, self.grid.prevs[self.index])
+    def set_distance(self, distance):
+        self.grid.distances[self.index] = distance
+    def get_distance(self):
+        return self.grid.distances[self.index]
+    def get_flags(self):
+        return self.grid.flags[self.index]
+    def set_flags(self, flags):
+        self.grid.flags[self.index] = flags
+
+    def get_mask(self):
+        return self.grid.mask(self.index)
+    def has_door(self, direction):
+        return (self.get_mask() >> direction) & 1 == 1
+    def get_door_count(self):
+        return BIT_COUNT[self.get_mask()]
+    def is_unlinked(self):
+        return self.get_mask() == 0
+    def add_door(self, direction, door):
+        if door is None:
+            self.grid.clear_bit(self.index, direction)
+        else:
+            _ = door.get_direction() # will throw an exception of door isn't a Door
+            self.grid.set_bit(self.index, direction)
+    def door_targets(self):
+        mask = self.get_mask()
+        targets = [(d, self.grid.over_neighbor(self.index, d)) for d in range(4) if mask & (1 << d)]
+        return [(d, n) for (d, n) in targets if n is not None]
+    def get_neighbors(self):
+        return [n for (d, n) in self.door_targets()]
+    def get_doors(self):
+        return [Door(self, d, n) for (d, n) in self.door_targets()]
+
+    def set_under_cell(self, other):
+        if other is None:
+            self.grid.unders.pop(self.index, None)
+        elif self.index not in self.grid.unders:
+            self.grid.new_under_cell(self)
+    def get_under_cell(self):
+        if self.index in self.grid.unders:
+            return PackedUnderCell(self.grid, self.index)
+        return None
+    def has_under_cell(self):
+        return self.index in self.grid.unders
+
+    def is_free_to_use_in_template(self):
+        return not self.get_flags() & TEMPLATE_LOCK
+    def is_free_to_link(self):
+        return not self.get_flags() & LINK_LOCK
+    def lock_template(self):
+        self.set_flags(self.get_flags() | TEMPLATE_LOCK)
+        if self.grid.locks is not None:
+            self.grid.locks.lock(self.get_id()) # under cell ids are not tracked
+        if self.grid.masks is not None:
+            self.grid.masks.locked(self.get_id())
+    def lock_link(self):
+        self.set_flags(self.get_flags() | LINK_LOCK)
+        if self.grid.masks is not None:
+            self.grid.masks.locked(self.get_id())
+
+class PackedUnderCell(PackedCell):
+    '''View of the under cell woven beneath the over cell at index.'''
+    __slots__ = ()
+    def get_id(self):
+        return self.state().id
+    def __str__(self):
+        return 'UnderCell%s%s' % (self.grid.zone, self.get_coord())
+    def state(self):
+        return self.grid.unders[self.index]
+    def set_color(self, color):
+        state = self.state()
+        state.color = color
+        state.stamp = self.grid.epoch
+        self.grid.painted += 1
+    def get_color(self):
+        state = self.state()
+        if state.stamp == self.grid.epoch:
+            return state.color
+        return self.grid.background
+    def set_prev(self, prev):
+        self.state().prev = self.grid.encode_prev(prev)
+    def get_prev(self):
+        return self.grid.decode_prev(self.index, self.state().prev)
+    def set_distance(self, distance):
+        self.state().distance = distance
+    def get_distance(self):
+        return self.state().distance
+    def get_flags(self):
+        return self.state().flags
+    def set_flags(self, flags):
+        self.state().flags = flags
+    def get_mask(self):
+        return self.state().mask
+    def add_door(self, direction, door):
+        if door is None:
+            self.state().mask &= ~(1 << direction)
+        else:
+            _ = door.get_direction()
+            self.state().mask |= 1 << direction
+    def door_targets(self):
+        mask = self.get_mask()
+        others = [(d, self.grid.coords.step(self.index, d)) for d in range(4) if mask & (1 << d)]
+        return [(d, PackedCell(self.grid, o)) for (d, o) in others if o >= 0]
+    def get_under_cell(self):
+        return None
+    def has_under_cell(self):
+        return False
+
+class TestPackedGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = PackedGrid(3, 3, 'P')
+    def test_mask_nibbles_are_independent(self):
+        self.grid.set_bit(0, EAST)
+        self.grid.set_bit(1, WEST)
+        self.grid.set_bit(1, SOUTH)
+        self.assertEqual(len(self.grid.wall_mask), 5)
+        self.assertEqual(self.grid.mask(0), 1 << EAST)
+        self.assertEqual(self.grid.mask(1), (1 << WEST) | (1 << SOUTH))
+        self.grid.clear_bit(1, WEST)
+        self.assertEqual(self.grid.mask(0), 1 << EAST)
+        self.assertEqual(self.grid.mask(1), 1 << SOUTH)
+    def test_add_remove_door(self):
+        self.grid.add_door(Coord(1, 1), EAST)
+        a = self.grid.cell(1, 1)
+        b = self.grid.cell(1, 2)
+        self.assertTrue(a.has_door(EAST))
+        self.assertTrue(b.has_door(WEST))
+        self.assertEqual(a.get_neighbors(), [b])
+        self.assertEqual(b.get_neighbors(), [a])
+        self.assertEqual(a.get_doors()[0].get_other_side(a), b)
+        self.grid.remove_door(Coord(1, 2), WEST)
+        self.assertTrue(a.is_unlinked())
+        self.assertTrue(b.is_unlinked())
+    def test_door_to_the_outside(self):
+        first = self.grid.cell(0, 0)
+        first.add_door(WEST, DoorToTheOutside(first, WEST))
+        self.assertTrue(first.has_door(WEST))
+        self.assertEqual(first.get_door_count(), 1)
+        self.assertEqual(first.get_doors(), [])
+        self.assertEqual(first.get_neighbors(), [])
+    def test_views_compare_by_position(self):
+        self.assertEqual(self.grid.cell(2, 1), self.grid.cell(2, 1))
+        self.assertNotEqual(self.grid.cell(2, 1), self.grid.cell(1, 2))
+        self.assertEqual(str(self.grid.cell(2, 1)), 'Cell_7(2,1)')
+        self.assertEqual(self.grid.cell(2, 1).get_coord(), Coord(2, 1))
+    def test_prev(self):
+        a = self.grid.cell(1, 1)
+        self.assertEqual(a.get_prev(), Coord(1, 1))
+        a.set_prev(Coord(0, 1))
+        self.assertEqual(a.get_prev(), Coord(0, 1))
+        a.set_prev(self.grid.cell(1, 0))
+        self.assertEqual(a.get_prev(), self.grid.cell(1, 0))
+        a.set_prev(None)
+        self.assertEqual(a.get_prev(), None)
+    def test_locks(self):
+        a = self.grid.cell(1, 1)
+        self.assertTrue(a.is_free_to_use_in_template())
+        a.lock_template()
+        self.assertFalse(a.is_free_to_use_in_template())
+        self.assertTrue(a.is_free_to_link())
+        a.lock_link()
+        self.assertFalse(a.is_free_to_link())
+        self.assertTrue(self.grid.cell(1, 2).is_free_to_link())
+        free = self.grid.free_template_index()
+        self.assertEqual(len(free), 8)
+        self.grid.cell(0, 0).lock_template()
+        self.assertEqual(sorted(free.ids), [1, 2, 3, 5, 6, 7, 8])
+    def test_under_cell(self):
+        self.grid.add_door(Coord(1, 1), EAST)
+        self.grid.add_door(Coord(1, 1), WEST)
+        over = self.grid.cell(1, 1)
+        under = self.grid.new_under_cell(over)
+        self.grid.add_under_door(under, NORTH)
+        self.grid.add_under_door(under, SOUTH)
+        self.assertTrue(over.has_under_cell())
+        self.assertEqual(over.get_under_cell(), under)
+        self.assertNotEqual(over, under)
+        self.assertEqual(under.get_id(), 9)
+        self.assertEqual(self.grid.view(9), under)
+        self.assertEqual(self.grid.cell_count(), 10)
+        self.assertEqual(self.grid.woven_cells(), [over])
+        self.assertEqual(self.grid.under_masks(), [(4, 9, (1 << NORTH) | (1 << SOUTH))])
+        self.assertEqual(self.grid.door_masks(), bytearray([0, 4, 0, 2, 10, 8, 0, 1, 0]))
+        self.assertEqual(under.get_neighbors(), [self.grid.cell(0, 1), self.grid.cell(2, 1)])
+        self.assertEqual(self.grid.cell(0, 1).get_neighbors(), [under])
+        self.assertEqual(self.grid.cell(1, 0).get_neighbors(), [over])
+        self.grid.color_all(6)
+        self.assertEqual(under.get_color(), 6)
+        under.set_color(2)
+        self.assertEqual(over.get_color(), 6)
+        self.grid.color_all(1)
+        self.assertEqual(under.get_color(), 1)
+    def test_rows_are_lazy(self):
+        row = self.grid[2]
+        self.assertEqual(len(row), 3)
+        self.assertEqual(row[1], self.grid.cell(2, 1))
+        self.assertEqual(list(row), [self.grid.cell(2, y) for y in range(3)])
+        self.assertEqual(sum(1 for r in self.grid for c in r), 9)
+        self.assertRaises(IndexError, row.__getitem__, 3)
+    def test_no_resident_cells(self):
+        gc.collect()
+        before = sum(1 for o in gc.get_objects() if isinstance(o, PackedCell))
+        grid = PackedGrid(40, 50, 'P')
+        for x in range(40):
+            for y in range(49):
+                grid.cell(x, y).add_door(EAST, Door(None, EAST, None))
+        self.assertEqual(sum(1 for o in gc.get_objects() if isinstance(o, PackedCell)), before)
+    def test_color_all(self):
+        self.grid.cell(0, 1).set_color(5)
+        self.grid.color_all(3)
+        self.assertEqual(len(self.grid.get_all_color(3)), 9)
+        self.grid.cell(2, 2).set_color(4)
+        self.assertEqual(self.grid.get_all_color(4), [self.grid.cell(2, 2)])
+        self.assertEqual(self.grid.cell(0, 1).get_color(), 3)
+        self.assertNotEqual(self.grid.paint_token(), ('fresh', 3))
+        self.grid.color_all(3)
+        self.assertEqual(self.grid.paint_token(), ('fresh', 3))
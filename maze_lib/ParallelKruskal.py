@@ -0,0 +1,101 @@
+import unittest
+import random
+import multiprocessing
+from array import array
+from DisjointSet import *
+
+# Walls are numbered as in Maze.nextdoor_edge_ids: cell*2 is the wall north of cell,
+# cell*2+1 the wall east of it.
+#
+# Kruskal on a shuffled wall list builds the same maze as a minimum spanning tree over
+# random wall weights. Each strip of rows is reduced to its own spanning tree in a
+# worker, which leaves every strip one component. The strips are then stitched by a
+# union-find pass over just the seam walls between them, lightest first, with one set
+# per strip: only the seams are looked at again, never the walls inside a strip. The
+# result is a perfect maze, though not the one Kruskal over the whole grid would make.
+
+PARALLEL_KRUSKAL_STRIPS = 8 # fixed, so a seed gives the same maze on any machine
+
+def strip_kruskal(task):
+    '''
+    Kruskal over the walls inside rows x0..x1-1.
+    Returns the walls of the strip's tree as an array('i'), lightest first.
+    '''
+    (x0, x1, width, seed) = task
+    rng = random.Random(seed)
+    weighted = []
+    for x in range(x0, x1):
+        for y in range(width):
+            cell = x * width + y
+            if x > x0:
+                weighted.append((rng.random(), cell * 2))
+            if y < width - 1:
+                weighted.append((rng.random(), cell * 2 + 1))
+    weighted.sort()
+    first = x0 * width
+    sets = DisjointSet((x1 - x0) * width)
+    walls = array('i')
+    for (weight, wall) in weighted:
+        cell = wall >> 1
+        other = cell + 1 if wall & 1 else cell - width
+        if sets.union(cell - first, other - first):
+            walls.append(wall)
+    return walls
+
+def strip_bounds(height, strips):
+    '''(x0, x1) row ranges splitting height rows into at most strips nearly equal strips.'''
+    strips = max(1, min(strips, height))
+    edges = [(height * k) // strips for k in range(strips + 1)]
+    return [(edges[k], edges[k + 1]) for k in range(strips)]
+
+def parallel_kruskal_walls(height, width, seed, strips, processes=None):
+    '''
+    The walls to open for a Kruskal maze of height x width, worked out strip by strip,
+    as an array('i'). The answer depends only on seed and strips, never on how many
+    processes ran.
+    '''
+    master = random.Random(seed)
+    bounds = strip_bounds(height, strips)
+    tasks = [(x0, x1, width, master.getrandbits(64)) for (x0, x1) in bounds]
+    if processes == 1 or len(tasks) == 1:
+        trees = [strip_kruskal(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            trees = pool.map(strip_kruskal, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    opened = array('i')
+    for walls in trees:
+        opened.extend(walls)
+    # seam k runs along the top of strip k, between it and strip k - 1
+    seams = sorted((master.random(), k, (bounds[k][0] * width + y) * 2) for k in range(1, len(bounds)) for y in range(width))
+    strip_sets = DisjointSet(len(bounds))
+    for (weight, k, wall) in seams:
+        if strip_sets.union(k - 1, k):
+            opened.append(wall)
+    return opened
+
+class TestParallelKruskal(unittest.TestCase):
+    def test_strip_bounds(self):
+        self.assertEqual(strip_bounds(10, 3), [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(strip_bounds(2, 5), [(0, 1), (1, 2)])
+    def test_strip_is_a_tree(self):
+        walls = strip_kruskal((2, 5, 4, 9))
+        self.assertEqual(len(walls), 3 * 4 - 1)
+        self.assertTrue(all(8 <= w >> 1 < 20 for w in walls))
+        self.assertFalse(any(w & 1 == 0 and w >> 1 < 12 for w in walls)) # nothing north out of the strip
+    def test_spanning_tree(self):
+        opened = parallel_kruskal_walls(9, 7, 5, 3, 1)
+        self.assertEqual(len(opened), 9 * 7 - 1)
+        sets = DisjointSet(9 * 7)
+        for wall in opened:
+            cell = wall >> 1
+            sets.union(cell, cell + 1 if wall & 1 else cell - 7)
+        self.assertEqual(sets.count, 1)
+        self.assertEqual(len([w for w in opened if w & 1 == 0 and (w >> 1) // 7 in (3, 6)]), 2) # one door through each seam
+    def test_repeatable(self):
+        walls = parallel_kruskal_walls(9, 7, 5, 3, 1)
+        self.assertEqual(parallel_kruskal_walls(9, 7, 5, 3, 2), walls)
+        self.assertNotEqual(parallel_kruskal_walls(9, 7, 6, 3, 1), walls)
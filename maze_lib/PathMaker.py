@@ -1,14 +1,16 @@
 import unittest
 import random
 from LineStuff import *
+from MazeRandom import *
 
 class PathMaker(object):
-    def __init__(self, span_x, span_y, inner_point_count, step_count=1):
+    def __init__(self, span_x, span_y, inner_point_count, step_count=1, rng=None):
+        rng = rng if rng is not None else SHARED_RANDOM
         self.span_x = span_x
         self.span_y = span_y
         self.inner_point_count = inner_point_count
         self.elligable_points = self._all_inner_points()
-        random.shuffle(self.elligable_points)
+        rng.shuffle(self.elligable_points)
     def _all_inner_points(self, step_count=1):
         inner_points = []
         for x in range(0, self.span_x-2, step_count):
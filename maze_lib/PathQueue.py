@@ -1,15 +1,21 @@
 import unittest
 import heapq
+import itertools
+
+# Both queues break ties in the order items were added. Left to the items, a tie
+# fell through to comparing Coord or Cell objects, which Python 2 orders by
+# address, so the same seed could give a different maze from run to run.
 
 class PathQueue(object):
     def __init__(self, upper_limit):
         self.upper_limit = upper_limit
         self.heap = []
+        self.added = itertools.count()
     def add(self, path):
         inverted_length = self.upper_limit - len(path)
-        heapq.heappush(self.heap, (inverted_length, path))
+        heapq.heappush(self.heap, (inverted_length, next(self.added), path))
     def pop(self):
-        (inverted_length, path) = heapq.heappop(self.heap)
+        (inverted_length, order, path) = heapq.heappop(self.heap)
         return path
     def count(self):
         return len(self.heap)
@@ -29,15 +35,25 @@ class TestPathQueue(unittest.TestCase):
         uut.add([5, 6])
         uut.add([7, 8, 9, 10, 11, 12, 13, 14])
         self.assertEqual(uut.count(), 3)
+    def test_ties_in_order_added(self):
+        class Unordered(object):
+            def __lt__(self, other):
+                raise AssertionError('compared items')
+        uut = PathQueue(1000)
+        paths = [[Unordered(), Unordered()] for i in range(5)]
+        for path in paths:
+            uut.add(path)
+        self.assertEqual([uut.pop() for path in paths], paths)
 
 
 class DistanceQueue(object):
     def __init__(self):
         self.heap = []
+        self.added = itertools.count()
     def add(self, distance, item):
-        heapq.heappush(self.heap, (distance, item))
+        heapq.heappush(self.heap, (distance, next(self.added), item))
     def pop(self):
-        (distance, item) = heapq.heappop(self.heap)
+        (distance, order, item) = heapq.heappop(self.heap)
         return item
     def count(self):
         return len(self.heap)
@@ -52,3 +68,9 @@ class TestDistanceQueue(unittest.TestCase):
         self.assertEqual(1, uut.pop())
         self.assertEqual(2, uut.pop())
         self.assertEqual(3, uut.pop())
+    def test_ties_in_order_added(self):
+        uut = DistanceQueue()
+        for item in [5, 1, 4]:
+            uut.add(2, item)
+        uut.add(1, 9)
+        self.assertEqual([uut.pop() for i in range(4)], [9, 5, 1, 4])
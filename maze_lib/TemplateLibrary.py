@@ -0,0 +1,217 @@
+import unittest
+import random
+from array import array
+from MazeRandom import *
+try:
+   import numpy
+except ImportError:
+   numpy = None # placing then goes one candidate at a time
+from Coord import *
+
+class Template(object):
+    '''
+    A template as data rather than as a procedure. Everything is given as (dx, dy)
+    offsets from the template's anchor cell:
+      doors      (dx, dy, direction) doors to open, joining the Kruskal sets they link
+      footprint  cells that must be free for templates; the doors' cells always are
+      link_locks cells later Kruskal joins must leave alone
+      tunnels    cells to tunnel under once the doors are open (see tunnel_under_existing_path)
+    Every footprint cell is coloured and locked for templates when the template is stamped.
+    '''
+    def __init__(self, name, doors, footprint=(), link_locks=(), tunnels=()):
+        self.name = name
+        self.doors = list(doors)
+        self.link_locks = list(link_locks)
+        self.tunnels = list(tunnels)
+        cells = set(footprint)
+        for (dx, dy, direction) in self.doors:
+            cells.add((dx, dy))
+            cells.add((dx + (-1, 0, 1, 0)[direction], dy + (0, 1, 0, -1)[direction]))
+        cells.update(self.link_locks)
+        cells.update(self.tunnels)
+        self.footprint = sorted(cells)
+    def __repr__(self):
+        return 'Template(%r)' % self.name
+
+def box(delta=1):
+    '''The footprint of the square of radius delta around the anchor.'''
+    return [(dx, dy) for dx in range(-delta, delta + 1) for dy in range(-delta, delta + 1)]
+
+def straight_run(name, direction, length):
+    '''length cells in a line, as kruskal_run lays them when nothing is in the way.'''
+    (sx, sy) = ((-1, 0, 1, 0)[direction], (0, 1, 0, -1)[direction])
+    doors = [(k * sx, k * sy, direction) for k in range(length - 1)]
+    return Template(name, doors, link_locks=[(k * sx, k * sy) for k in range(1, length - 2)])
+
+class CompiledTemplate(object):
+    '''One template's offset tables for a grid of a given width, in packed cell ids.'''
+    def __init__(self, template, height, width):
+        self.template = template
+        xs = [dx for (dx, dy) in template.footprint]
+        ys = [dy for (dx, dy) in template.footprint]
+        # the anchors that keep the whole footprint on the grid
+        self.x_range = (-min(xs), height - max(xs))
+        self.y_range = (-min(ys), width - max(ys))
+        self.footprint = array('i', [dx * width + dy for (dx, dy) in template.footprint])
+        self.doors = [(dx * width + dy, direction, (dx * width + dy) + (-width, 1, width, -1)[direction])
+                      for (dx, dy, direction) in template.doors]
+        self.link_locks = array('i', [dx * width + dy for (dx, dy) in template.link_locks])
+        self.tunnels = array('i', [dx * width + dy for (dx, dy) in template.tunnels])
+        if numpy is not None:
+            self.footprint_offsets = numpy.array(self.footprint, dtype=numpy.int64)
+    def fits_at(self, x, y):
+        return self.x_range[0] <= x < self.x_range[1] and self.y_range[0] <= y < self.y_range[1]
+
+class CompiledTemplates(object):
+    '''
+    A template library compiled for one grid size. place() picks many non-overlapping,
+    feasible (kind, anchor) instances at once; the maze then stamps them.
+    '''
+    def __init__(self, templates, height, width):
+        self.height = height
+        self.width = width
+        self.size = height * width
+        self.tables = [CompiledTemplate(t, height, width) for t in templates]
+
+    def place(self, locked, free_ids, count=None, rng=SHARED_RANDOM):
+        '''
+        Up to count non-overlapping instances, in a random order, whose footprints are
+        free in locked (a bytearray over the grid ids, 1 for locked) and anchored on one
+        of free_ids. Returns a list of (kind, anchor) pairs, kind indexing self.tables.
+        The order is drawn from rng, a MazeRandom.
+        '''
+        if numpy is None:
+            return self.place_one_by_one(locked, free_ids, count, rng)
+        state = numpy.random.RandomState(rng.getrandbits(32)) # so seeding rng replays it
+        occupied = numpy.frombuffer(bytes(locked), dtype=numpy.uint8).copy()
+        free_ids = numpy.array(free_ids, dtype=numpy.int64)
+        (x, y) = (free_ids // self.width, free_ids % self.width)
+        kinds = []
+        anchors = []
+        for (k, table) in enumerate(self.tables):
+            fits = (x >= table.x_range[0]) & (x < table.x_range[1]) & (y >= table.y_range[0]) & (y < table.y_range[1])
+            anchors.append(free_ids[fits])
+            kinds.append(numpy.full(fits.sum(), k, dtype=numpy.int64))
+        kinds = numpy.concatenate(kinds)
+        anchors = numpy.concatenate(anchors)
+        order = state.permutation(len(anchors)) # position in this order is each candidate's priority
+        (kinds, anchors) = (kinds[order], anchors[order])
+        alive = numpy.ones(len(anchors), dtype=bool)
+        chosen = []
+        wanted = len(anchors) if count is None else count
+        while wanted > 0:
+            live = numpy.nonzero(alive)[0]
+            (cells, owner) = self.footprints(kinds[live], anchors[live])
+            blocked = numpy.bincount(owner, weights=occupied[cells], minlength=len(live)) > 0
+            alive[live[blocked]] = False
+            keep = ~blocked[owner]
+            (cells, owner) = (cells[keep], owner[keep])
+            if len(cells) == 0:
+                break
+            # every cell goes to the first live candidate wanting it; those that get
+            # all of their cells are independent of each other and placed this round
+            claim = numpy.full(self.size, len(live), dtype=numpy.int64)
+            numpy.minimum.at(claim, cells, owner)
+            lost = numpy.bincount(owner, weights=claim[cells] != owner, minlength=len(live))
+            won = numpy.nonzero((lost == 0) & ~blocked)[0][:wanted]
+            placed = numpy.zeros(len(live), dtype=bool)
+            placed[won] = True
+            occupied[cells[placed[owner]]] = 1
+            alive[live[won]] = False
+            chosen.extend(live[won])
+            wanted -= len(won)
+        return [(int(kinds[i]), int(anchors[i])) for i in chosen]
+
+    def footprints(self, kinds, anchors):
+        '''Every footprint cell of the given instances, with the position of the instance it belongs to.'''
+        cells = [numpy.zeros(0, dtype=numpy.int64)]
+        owner = [numpy.zeros(0, dtype=numpy.int64)]
+        for (k, table) in enumerate(self.tables):
+            at = numpy.nonzero(kinds == k)[0]
+            cells.append((anchors[at][:, None] + table.footprint_offsets[None, :]).ravel())
+            owner.append(numpy.repeat(at, len(table.footprint)))
+        return (numpy.concatenate(cells), numpy.concatenate(owner))
+
+    def place_one_by_one(self, locked, free_ids, count=None, rng=SHARED_RANDOM):
+        '''place() without numpy: the same rules, checking the shuffled candidates in turn.'''
+        occupied = bytearray(locked)
+        candidates = [(k, i) for (k, table) in enumerate(self.tables) for i in free_ids
+                      if table.fits_at(i // self.width, i % self.width)]
+        rng.shuffle(candidates)
+        chosen = []
+        for (k, anchor) in candidates:
+            if count is not None and len(chosen) == count:
+                break
+            cells = [anchor + offset for offset in self.tables[k].footprint]
+            if not any(occupied[i] for i in cells):
+                for i in cells:
+                    occupied[i] = 1
+                chosen.append((k, anchor))
+        return chosen
+
+class TemplateLibrary(object):
+    '''A list of templates, compiled once for each grid size asked about.'''
+    def __init__(self, templates):
+        self.templates = list(templates)
+        self.compiled = {}
+    def compile(self, height, width):
+        key = (height, width)
+        if key not in self.compiled:
+            self.compiled[key] = CompiledTemplates(self.templates, height, width)
+        return self.compiled[key]
+
+# the fixed shapes of kruskal_weave_over_under_cross, kruskal_corner and kruskal_run
+STANDARD_TEMPLATES = TemplateLibrary([
+    Template('weave east-west', [(0, 0, EAST), (0, 0, WEST)], box(1), tunnels=[(0, 0)]),
+    Template('weave north-south', [(0, 0, NORTH), (0, 0, SOUTH)], box(1), tunnels=[(0, 0)]),
+    Template('corner', [(0, 0, EAST), (0, 0, SOUTH), (-1, 0, EAST), (0, -1, SOUTH), (-1, -1, EAST), (-1, -1, SOUTH)],
+             box(1), link_locks=[(-1, 0), (0, -1)]),
+    straight_run('run east', EAST, 6),
+    straight_run('run south', SOUTH, 6),
+])
+
+class TestTemplateLibrary(unittest.TestCase):
+    def setUp(self):
+        self.compiled = STANDARD_TEMPLATES.compile(8, 9)
+    def test_template(self):
+        corner = STANDARD_TEMPLATES.templates[2]
+        self.assertEqual(corner.footprint, box(1))
+        run = STANDARD_TEMPLATES.templates[3]
+        self.assertEqual(run.footprint, [(0, y) for y in range(6)])
+        self.assertEqual(run.link_locks, [(0, 1), (0, 2), (0, 3)])
+    def test_compile(self):
+        self.assertTrue(STANDARD_TEMPLATES.compile(8, 9) is self.compiled)
+        weave = self.compiled.tables[0]
+        self.assertEqual(list(weave.footprint), [-10, -9, -8, -1, 0, 1, 8, 9, 10])
+        self.assertEqual(weave.doors, [(0, EAST, 1), (0, WEST, -1)])
+        self.assertEqual((weave.x_range, weave.y_range), ((1, 7), (1, 8)))
+        run = self.compiled.tables[3]
+        self.assertEqual((run.x_range, run.y_range), ((0, 8), (0, 4)))
+        self.assertFalse(run.fits_at(0, 4))
+    def check(self, placed, locked):
+        taken = set()
+        for (k, anchor) in placed:
+            cells = [anchor + offset for offset in self.compiled.tables[k].footprint]
+            self.assertTrue(self.compiled.tables[k].fits_at(anchor // 9, anchor % 9))
+            self.assertFalse(any(locked[i] for i in cells))
+            self.assertFalse(taken.intersection(cells))
+            taken.update(cells)
+    def test_place_one_by_one(self):
+        random.seed(2)
+        locked = bytearray(72)
+        locked[40] = 1
+        placed = self.compiled.place_one_by_one(locked, [i for i in range(72) if i != 40])
+        self.assertTrue(len(placed) > 3)
+        self.check(placed, locked)
+        self.assertEqual(len(self.compiled.place_one_by_one(locked, range(72), 2)), 2)
+    @unittest.skipIf(numpy is None, 'placing in bulk needs numpy')
+    def test_place(self):
+        random.seed(2)
+        locked = bytearray(72)
+        locked[40] = 1
+        placed = self.compiled.place(locked, [i for i in range(72) if i != 40])
+        self.check(placed, locked)
+        self.assertTrue(len(placed) > 3)
+        self.assertEqual(len(self.compiled.place(locked, range(72), 2)), 2)
+        random.seed(2)
+        self.assertEqual(self.compiled.place(locked, [i for i in range(72) if i != 40]), placed)
@@ -0,0 +1,98 @@
+import unittest
+from array import array
+from FreeCellIndex import *
+
+class TemplateLocks(object):
+    '''
+    The template locks of a grid's cells, as arrays: which cells are locked, an index
+    of the ones still free, and, for each box radius asked about, how many locked cells
+    lie within that radius of every cell. A radius' counts start from a summed-area
+    table of the locks and every lock after that bumps them, so whether a box is
+    free is a single lookup whatever its size.
+    '''
+    def __init__(self, height, width, locked_ids=()):
+        self.height = height
+        self.width = width
+        self.size = height * width
+        self.locked = bytearray(self.size)
+        for i in locked_ids:
+            self.locked[i] = 1
+        if locked_ids:
+            self.free = FreeCellIndex(self.size, [i for i in range(self.size) if not self.locked[i]])
+        else:
+            self.free = FreeCellIndex(self.size)
+        self.near = {} # radius -> locked cell count within that radius of each cell
+
+    def lock(self, i):
+        '''Lock grid cell i; ids past the grid (under cells) are not tracked.'''
+        if not 0 <= i < self.size or self.locked[i]:
+            return
+        self.locked[i] = 1
+        self.free.discard(i)
+        if self.near:
+            (x, y) = divmod(i, self.width)
+            for (delta, counts) in self.near.items():
+                for cx in range(max(0, x - delta), min(self.height, x + delta + 1)):
+                    row = cx * self.width
+                    for cy in range(max(0, y - delta), min(self.width, y + delta + 1)):
+                        counts[row + cy] += 1
+
+    def box_is_free(self, x, y, delta):
+        '''True if the box of radius delta around (x, y) is on the grid and has no locked cell.'''
+        if x < delta or y < delta or x + delta >= self.height or y + delta >= self.width:
+            return False
+        counts = self.near.get(delta)
+        if counts is None:
+            counts = self.count_near(delta)
+        return counts[x * self.width + y] == 0
+
+    def box_ids(self, x, y, delta):
+        '''The ids of the grid cells in the box of radius delta around (x, y).'''
+        return [cx * self.width + cy
+                for cx in range(max(0, x - delta), min(self.height, x + delta + 1))
+                for cy in range(max(0, y - delta), min(self.width, y + delta + 1))]
+
+    def count_near(self, delta):
+        (height, width) = (self.height, self.width)
+        stride = width + 1
+        table = array('i', [0]) * ((height + 1) * stride) # table[x*stride+y]: locks above and left of (x, y)
+        for x in range(height):
+            running = 0
+            for y in range(width):
+                running += self.locked[x * width + y]
+                table[(x + 1) * stride + y + 1] = table[x * stride + y + 1] + running
+        if (2 * delta + 1) ** 2 < 256:
+            counts = bytearray(self.size)
+        else:
+            counts = array('i', [0]) * self.size
+        for x in range(height):
+            (top, bottom) = (max(0, x - delta) * stride, min(height, x + delta + 1) * stride)
+            for y in range(width):
+                (left, right) = (max(0, y - delta), min(width, y + delta + 1))
+                counts[x * width + y] = table[bottom + right] - table[top + right] - table[bottom + left] + table[top + left]
+        self.near[delta] = counts
+        return counts
+
+class TestTemplateLocks(unittest.TestCase):
+    def setUp(self):
+        self.locks = TemplateLocks(6, 7, [2 * 7 + 3])
+    def test_box_is_free(self):
+        self.assertFalse(self.locks.box_is_free(2, 2, 1))
+        self.assertTrue(self.locks.box_is_free(4, 1, 1))
+        self.assertFalse(self.locks.box_is_free(0, 3, 1)) # off the grid
+        self.assertTrue(self.locks.box_is_free(4, 5, 1))
+        self.assertFalse(self.locks.box_is_free(4, 4, 2))
+        self.locks.lock(5 * 7 + 6)
+        self.assertFalse(self.locks.box_is_free(4, 5, 1))
+        self.assertTrue(self.locks.box_is_free(4, 1, 1))
+    def test_counts_match_a_scan(self):
+        self.locks.box_is_free(3, 3, 1) # radius 1 counts are then kept up by each lock
+        for i in [0, 9, 20, 33, 41, 41, 100]:
+            self.locks.lock(i)
+        self.locks.count_near(3) # radius 3 counts come from the summed-area table
+        for delta in [1, 3]:
+            for x in range(6):
+                for y in range(7):
+                    expected = sum(self.locks.locked[i] for i in self.locks.box_ids(x, y, delta))
+                    self.assertEqual(self.locks.near[delta][x * 7 + y], expected)
+        self.assertEqual(len(self.locks.free), 42 - 6)
@@ -0,0 +1,164 @@
+import unittest
+import random
+from array import array
+from Coord import *
+from BicolorFrontier import *
+from MazeRandom import *
+
+UNKNOWN = 0xFF # doors or lock of a cell not read from the grid yet
+
+# the directions set in each 4-bit mask, in the order the pickers always listed them
+MASK_DIRECTIONS = [tuple(d for d in range(4) if m & (1 << d)) for m in range(16)]
+
+class WalkMasks(object):
+    '''
+    For every grid cell, the directions a Kruskal walk may step in, as two 4-bit
+    masks in one byte. The low nibble holds the walls to a differently coloured
+    neighbour on the grid (the pick_random_bicolor_wall rule), the high nibble
+    those whose neighbour is also free to link and free for templates (the
+    pick_random_bicolor_unlocked_wall rule).
+    The grid reports every colour, door and lock change with the new value, which
+    goes into a copy of the colours, doors and locks kept here, so bringing the
+    walls next to a change up to date seldom looks at a cell object. A cell's doors
+    and locks are only read from the grid once its walls could matter, that is once
+    it or a neighbour changes colour.
+    '''
+    def __init__(self, grid, background=None, doors=None, free=None):
+        '''
+        background: the one colour of every cell, if the grid was just repainted.
+        doors, free: every cell's door mask and free flag, for grids that have them
+        to hand; otherwise each cell is read when first needed.
+        '''
+        self.grid = grid
+        self.width = grid.width
+        self.size = grid.height * grid.width
+        self.masks = bytearray(self.size)
+        self.doors = doors if doors is not None else bytearray([UNKNOWN]) * self.size
+        self.free = free if free is not None else bytearray([UNKNOWN]) * self.size
+        self.frontier = None # a BicolorFrontier of the low nibbles, once asked for
+        self.rng = SHARED_RANDOM # what pick draws from; the maze hands over its own
+        if background is not None: # one colour everywhere, so nowhere to step yet
+            self.colors = array('i', [background]) * self.size
+            return
+        self.colors = array('i', [c.get_color() for row in grid for c in row])
+        for i in range(self.size):
+            self.load(i)
+        for i in range(self.size):
+            self.refresh(i)
+
+    def load(self, i):
+        '''Read the doors and locks of grid cell i, unless they are already known.'''
+        if self.doors[i] == UNKNOWN:
+            cell = self.grid.cell_at(i)
+            self.doors[i] = cell.get_mask()
+            if self.free[i] == UNKNOWN: # a lock may already have been reported
+                self.free[i] = 1 if cell.is_free_to_link() and cell.is_free_to_use_in_template() else 0
+    def neighbors(self, i):
+        '''The ids of the cells N, E, S and W of i, -1 past the edge.'''
+        w = self.width
+        y = i % w
+        return (i - w if i >= w else -1, i + 1 if y != w - 1 else -1,
+                i + w if i + w < self.size else -1, i - 1 if y else -1)
+    def refresh(self, i):
+        '''Work out the whole mask of cell i again; i and its neighbours are loaded.'''
+        (colors, free, doors) = (self.colors, self.free, self.doors[i])
+        color = colors[i]
+        m = 0
+        for (d, j) in enumerate(self.neighbors(i)):
+            if j >= 0 and not (doors >> d) & 1 and colors[j] != color:
+                m |= (0x11 if free[j] else 0x01) << d
+        self.masks[i] = m
+        if self.frontier is not None:
+            self.frontier.cell_changed(i, m)
+    def refresh_wall(self, i, d, j):
+        '''Work out again the bits cell i keeps for its wall on the d side, next to j.'''
+        bits = 0
+        # differing colours mean one of the two was repainted, so both are loaded
+        if self.colors[j] != self.colors[i] and not (self.doors[i] >> d) & 1:
+            bits = (0x11 if self.free[j] else 0x01) << d
+        self.masks[i] = (self.masks[i] & ~(0x11 << d)) | bits
+        if self.frontier is not None:
+            self.frontier.cell_changed(i, self.masks[i])
+
+    def color_changed(self, i, color):
+        if i >= self.size or self.colors[i] == color: # under cells are never stepped to
+            return
+        (colors, doors, free, masks) = (self.colors, self.doors, self.free, self.masks)
+        colors[i] = color
+        if doors[i] == UNKNOWN:
+            self.load(i)
+        m = 0
+        for (d, j) in enumerate(self.neighbors(i)):
+            if j < 0:
+                continue
+            if doors[j] == UNKNOWN:
+                self.load(j)
+            back = (d + 2) % 4
+            bits = 0
+            if colors[j] != color:
+                if not (doors[i] >> d) & 1:
+                    m |= (0x11 if free[j] else 0x01) << d
+                if not (doors[j] >> back) & 1:
+                    bits = (0x11 if free[i] else 0x01) << back
+            masks[j] = (masks[j] & ~(0x11 << back)) | bits
+            if self.frontier is not None:
+                self.frontier.cell_changed(j, masks[j])
+        masks[i] = m
+        if self.frontier is not None:
+            self.frontier.cell_changed(i, m)
+    def locked(self, i):
+        if i >= self.size or not self.free[i]:
+            return
+        self.free[i] = 0
+        for (d, j) in enumerate(self.neighbors(i)):
+            if j >= 0:
+                self.masks[j] &= ~(0x10 << ((d + 2) % 4))
+    def door_set(self, i, d, present):
+        '''The door on the d side of grid cell i was added (present) or removed.'''
+        j = self.neighbors(i)[d]
+        if j < 0 or self.doors[i] == UNKNOWN: # the grid is read when the cell is loaded
+            return
+        if present:
+            self.doors[i] |= 1 << d
+        else:
+            self.doors[i] &= ~(1 << d)
+        self.refresh_wall(i, d, j)
+    def door_added(self, i, d):
+        self.door_set(i, d, True)
+        self.door_set(self.neighbors(i)[d], (d + 2) % 4, True)
+    def door_removed(self, i, d):
+        self.door_set(i, d, False)
+        self.door_set(self.neighbors(i)[d], (d + 2) % 4, False)
+    def under_door_added(self, i, d):
+        '''A door from the under cell at i: only the cell it leads to sees a door.'''
+        self.door_set(self.neighbors(i)[d], (d + 2) % 4, True)
+    def repainted(self, color):
+        '''Every cell was just painted color; what is known of the doors and locks stays.'''
+        self.colors = array('i', [color]) * self.size
+        self.masks = bytearray(self.size)
+        if self.frontier is not None:
+            self.frontier.clear()
+
+    def bicolor_frontier(self):
+        '''The walls between colours as a BicolorFrontier, kept up to date from now on.'''
+        if self.frontier is None:
+            self.frontier = BicolorFrontier(self.size)
+            if self.masks.count(b'\0') != self.size:
+                for (i, m) in enumerate(self.masks):
+                    if m:
+                        self.frontier.cell_changed(i, m)
+        return self.frontier
+
+    def pick(self, i, unlocked=False):
+        '''A random direction grid cell i may step in, or None; one table lookup.'''
+        m = self.masks[i]
+        m = m >> 4 if unlocked else m & 0xF
+        if not m:
+            return None
+        return self.rng.choice(MASK_DIRECTIONS[m])
+
+class TestWalkMasks(unittest.TestCase):
+    def test_mask_directions(self):
+        self.assertEqual(MASK_DIRECTIONS[0], ())
+        self.assertEqual(MASK_DIRECTIONS[(1 << EAST) | (1 << WEST)], (EAST, WEST))
+        self.assertEqual(len(MASK_DIRECTIONS), 16)
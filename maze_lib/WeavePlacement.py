@@ -0,0 +1,58 @@
+import unittest
+import random
+from MazeRandom import *
+
+# A weave cross claims the 3x3 box around its centre, so two crosses fit together
+# only when their centres are at least 3 apart in x or in y. Cutting the grid into
+# k x k tiles (k >= 3) and keeping each cross's box inside its own tile makes every
+# tile an independent spot for one cross: a stratified sample with no rejections.
+
+def weave_tile_size(height, width, count):
+    '''The largest tile side, at least 3 and at most the grid's, that still cuts the grid into count tiles.'''
+    k = 3
+    while k < min(height, width) and (height // (k + 1)) * (width // (k + 1)) >= count:
+        k += 1
+    return k
+
+def weave_tile_count(height, width, count):
+    '''How many tiles weave_sites will offer; count weaves fit if this is at least count.'''
+    k = weave_tile_size(height, width, count)
+    return (height // k) * (width // k)
+
+def weave_sites(height, width, count, rng=SHARED_RANDOM):
+    '''
+    The places to try for count weave crosses, one list of (x, y) centres per tile,
+    tiles and centres both in random order. Stop at the first centre of a tile that
+    takes a cross and go on to the next tile; on a grid with nothing locked, the
+    first centre of each of the first count tiles always does. No count, no sites.
+    '''
+    if count <= 0:
+        return
+    k = weave_tile_size(height, width, count)
+    cols = width // k
+    tiles = list(range((height // k) * cols))
+    rng.shuffle(tiles)
+    for tile in tiles:
+        (x0, y0) = ((tile // cols) * k + 1, (tile % cols) * k + 1)
+        centres = [(x0 + dx, y0 + dy) for dx in range(k - 2) for dy in range(k - 2)]
+        rng.shuffle(centres)
+        yield centres
+
+class TestWeavePlacement(unittest.TestCase):
+    def test_tile_size(self):
+        self.assertEqual(weave_tile_size(30, 30, 100), 3)
+        self.assertEqual(weave_tile_size(30, 30, 25), 6)
+        self.assertEqual(weave_tile_size(30, 30, 500), 3) # more than fit
+        self.assertEqual(weave_tile_count(30, 30, 500), 100)
+        self.assertEqual(weave_tile_count(75, 100, 150), 192) # 6x6 tiles
+        self.assertEqual(weave_tile_size(30, 40, 0), 30) # capped, not endless
+        self.assertEqual(weave_tile_size(30, 40, 1), 30)
+        self.assertEqual(list(weave_sites(30, 40, 0)), [])
+    def test_sites_do_not_overlap(self):
+        random.seed(1)
+        firsts = [centres[0] for centres in weave_sites(40, 50, 40)]
+        self.assertTrue(len(firsts) >= 40)
+        for (i, (x, y)) in enumerate(firsts):
+            self.assertTrue(1 <= x < 39 and 1 <= y < 49)
+            for (u, v) in firsts[:i]:
+                self.assertTrue(abs(x - u) >= 3 or abs(y - v) >= 3)